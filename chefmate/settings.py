@@ -91,6 +91,18 @@ DATABASES = {
     }
 }
 
+# Cache
+# 响应缓存、用户可推荐菜谱 (eligibility)、库存食材向量等都保存在这里，失效操作必须对所有 worker 进程可见，
+# 因此缓存后端必须是共享的：默认使用数据库缓存表 (部署时需执行 `python manage.py createcachetable`)，
+# 也可配置为 Redis / Memcached。不要使用 LocMemCache，它是进程内的 (见 recipes/checks.py)。
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='chefmate_cache'),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -203,4 +215,22 @@ SIMPLE_JWT = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
-CORS_ALLOW_ALL_ORIGINS = True # <--- 在开发环境下为了方便测试，允许所有来源
\ No newline at end of file
+CORS_ALLOW_ALL_ORIGINS = True # <--- 在开发环境下为了方便测试，允许所有来源
+
+# --- ChefMate 业务配置 ---
+# match_mode=substitutes 时，通过替代品覆盖的食材在匹配度中的权重 (直接拥有的食材权重为 1)
+SUBSTITUTE_MATCH_WEIGHT = config('SUBSTITUTE_MATCH_WEIGHT', default=0.5, cast=float)
+# 进程内索引 (匹配、替代关系、搜索、补全) 检查其他进程写入 (版本号) 的最小间隔 (秒)，0 表示每次使用都检查
+INDEX_VERSION_CHECK_INTERVAL = config('INDEX_VERSION_CHECK_INTERVAL', default=1.0, cast=float)
+# 批量匹配接口 (recipes/match-batch/) 单次请求最多的食材组数
+MATCH_BATCH_MAX_BASKETS = config('MATCH_BATCH_MAX_BASKETS', default=5000, cast=int)
+# 批量加入购物清单接口 (recipes/add-to-shopping-list/) 单次请求最多的菜谱数
+SHOPPING_LIST_MAX_RECIPES = config('SHOPPING_LIST_MAX_RECIPES', default=200, cast=int)
+# 库存批量接口 (users/inventory/bulk/) 单次请求最多的食材数
+INVENTORY_BULK_MAX_ITEMS = config('INVENTORY_BULK_MAX_ITEMS', default=200, cast=int)
+# 购物清单批量修改接口 (users/shopping-list/bulk/) 单次请求最多的条目数
+SHOPPING_LIST_BULK_MAX_ITEMS = config('SHOPPING_LIST_BULK_MAX_ITEMS', default=500, cast=int)
+# 匿名用户菜谱列表 / 详情响应的缓存时间 (秒)，0 表示关闭；数据变化时通过版本号立即失效
+RECIPE_RESPONSE_CACHE_TIMEOUT = config('RECIPE_RESPONSE_CACHE_TIMEOUT', default=300, cast=int)
+# 每次执行 fold_trending_scores (结束一个热度窗口) 时热度的衰减系数，按每小时执行约 6.6 小时衰减一半
+TRENDING_DECAY = config('TRENDING_DECAY', default=0.9, cast=float)
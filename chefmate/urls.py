@@ -60,6 +60,9 @@ urlpatterns = [
     path('api/recipes/simple-list/', RecipeSimpleListView.as_view(), name='recipe-simple-list'),
     
     path('api/dietary-tags/', recipe_api_views.DietaryPreferenceTagListView.as_view(), name='dietary-tag-list'),
+
+    # 食材 / 菜谱名称的前缀 (拼音) 补全
+    path('api/autocomplete/', recipe_api_views.AutocompleteView.as_view(), name='autocomplete'),
     
     # 手动定义 reviews 的路径
     path('api/recipes/<int:recipe_pk>/reviews/', recipe_api_views.ReviewViewSet.as_view({'get': 'list', 'post': 'create'}), name='recipe-reviews-list'),
@@ -4,7 +4,7 @@ from .models import Ingredient, DietaryPreferenceTag, Recipe, RecipeIngredient,
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'description')
+    list_display = ('name', 'category', 'density', 'piece_weight', 'description')
     list_filter = ('category',)
     search_fields = ('name', 'description')
     filter_horizontal = ('common_substitutes',)
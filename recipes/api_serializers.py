@@ -1,8 +1,14 @@
 # recipes/api_serializers.py
 
 import json
+from django.conf import settings
+from django.db import transaction
 from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.utils import html
 from .models import Ingredient, DietaryPreferenceTag, Recipe, RecipeIngredient, Review, RecipeStep
+from .ratings import RATING_VALUES, rating_histogram_field
+from .substitutes import substitute_graph
 
 class IngredientSubstituteSerializer(serializers.ModelSerializer):
     """用于显示食材替代品的简化序列化器"""
@@ -23,7 +29,7 @@ class IngredientSerializer(serializers.ModelSerializer):
         model = Ingredient
         fields = (
             'id', 'name', 'category', 'category_display', 'description', 
-            'image_url', 'common_substitutes'
+            'image_url', 'density', 'piece_weight', 'common_substitutes'
         )
     
     def get_category_display(self, obj):
@@ -48,16 +54,38 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('ingredient_id', 'ingredient_name', 'ingredient_category', 'quantity', 'unit', 'notes', 'substitutes')
 
     def get_substitutes(self, obj):
-        """获取食材的替代品列表"""
-        substitutes = obj.ingredient.common_substitutes.all()
-        return IngredientSubstituteSerializer(substitutes, many=True).data
+        """获取食材的替代品列表 (来自进程内的替代关系图，字段同 IngredientSubstituteSerializer)"""
+        return substitute_graph.substitutes_for(obj.ingredient_id)
 
 class RecipeStepSerializer(serializers.ModelSerializer):
     class Meta:
         model = RecipeStep
         fields = ('id', 'step_number', 'description', 'image')
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class FavoritedMixin:
+    """
+    is_favorited 字段的实现：一次查询取回本次序列化涉及的菜谱中哪些被当前用户收藏，
+    结果缓存在序列化上下文中 (列表序列化时所有子项共享同一个上下文)。
+    """
+
+    def get_is_favorited(self, obj):
+        favorite_ids = self.context.get('favorite_recipe_ids')
+        if favorite_ids is None:
+            favorite_ids = self._load_favorite_ids()
+            self.context['favorite_recipe_ids'] = favorite_ids
+        return obj.pk in favorite_ids
+
+    def _load_favorite_ids(self):
+        request = self.context.get('request')
+        user = getattr(request, 'user', None)
+        if not (user and user.is_authenticated):
+            return frozenset()
+        instance = self.root.instance
+        recipes = [instance] if isinstance(instance, Recipe) else instance
+        recipe_ids = [recipe.pk for recipe in recipes]
+        return frozenset(user.favorite_recipes.filter(id__in=recipe_ids).values_list('id', flat=True))
+
+class RecipeListSerializer(FavoritedMixin, serializers.ModelSerializer):
     """用于菜谱列表，显示摘要信息"""
     author_username = serializers.CharField(source='author.username', read_only=True, allow_null=True)
     dietary_tags = DietaryPreferenceTagSerializer(many=True, read_only=True)
@@ -68,23 +96,71 @@ class RecipeListSerializer(serializers.ModelSerializer):
         fields = (
             'id', 'title', 'main_image', 'author_username',
             'cooking_time_minutes', 'difficulty', 'cuisine_type',
-            'dietary_tags', 'description', 'is_favorited'
+            'dietary_tags', 'description', 'is_favorited',
+            'rating_count', 'rating_average'
         )
         read_only_fields = fields
 
-    def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user and user.is_authenticated:
-            return obj in user.favorite_recipes.all()
-        return False
+class RecipeMatchSerializer(RecipeListSerializer):
+    """按已有食材匹配时的列表项，附带匹配度与缺少的食材数量 (由匹配引擎预先计算)"""
+    match_score = serializers.FloatField(read_only=True)
+    matched_count = serializers.IntegerField(source='matched_ingredients', read_only=True)
+    substituted_count = serializers.IntegerField(source='substituted_ingredients', read_only=True)
+    missing_count = serializers.IntegerField(source='missing_ingredients_count', read_only=True)
+    # 仅在请求 include_missing=true 时输出，形如 [{'id': 1, 'name': '番茄'}]
+    missing_ingredients = serializers.ListField(child=serializers.DictField(), read_only=True)
+
+    class Meta(RecipeListSerializer.Meta):
+        fields = RecipeListSerializer.Meta.fields + (
+            'match_score', 'matched_count', 'substituted_count', 'missing_count', 'missing_ingredients'
+        )
+        read_only_fields = fields
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if not self.context.get('include_missing'):
+            self.fields.pop('missing_ingredients')
+
+class RecipeBatchMatchSerializer(serializers.Serializer):
+    """批量匹配的请求体：多组食材 (每组一个食材 ID 列表)，每组返回前 top_k 个菜谱"""
+    baskets = serializers.ListField(
+        child=serializers.ListField(child=serializers.IntegerField(), allow_empty=True),
+        allow_empty=False,
+        max_length=settings.MATCH_BATCH_MAX_BASKETS
+    )
+    top_k = serializers.IntegerField(min_value=1, max_value=100, default=10)
+    match_mode = serializers.ChoiceField(choices=['exact', 'substitutes'], default='exact')
+
+class ShoppingListMultiplierSerializer(serializers.Serializer):
+    """加入购物清单时的份量倍数 (例如做双份为 2)"""
+    multiplier = serializers.FloatField(default=1.0)
+
+    def validate_multiplier(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("份量倍数必须大于 0。")
+        return value
 
-class RecipeDetailSerializer(serializers.ModelSerializer):
+class ShoppingListRecipeSerializer(ShoppingListMultiplierSerializer):
+    recipe_id = serializers.IntegerField()
+
+class ShoppingListBatchSerializer(serializers.Serializer):
+    """批量加入购物清单的请求体：[{"recipe_id": 1, "multiplier": 2}, ...]，同一菜谱出现多次时倍数累加"""
+    recipes = ShoppingListRecipeSerializer(many=True, allow_empty=False, max_length=settings.SHOPPING_LIST_MAX_RECIPES)
+
+    def validate_recipes(self, value):
+        multipliers = {}
+        for item in value:
+            multipliers[item['recipe_id']] = multipliers.get(item['recipe_id'], 0) + item['multiplier']
+        return multipliers
+
+class RecipeDetailSerializer(FavoritedMixin, serializers.ModelSerializer):
     """用于菜谱详情，显示完整信息"""
     author_username = serializers.CharField(source='author.username', read_only=True, allow_null=True)
     recipe_ingredients = RecipeIngredientSerializer(source='recipeingredient_set', many=True, read_only=True)
     dietary_tags = DietaryPreferenceTagSerializer(many=True, read_only=True)
     steps = RecipeStepSerializer(many=True, read_only=True)
     is_favorited = serializers.SerializerMethodField()
+    rating_histogram = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -93,15 +169,14 @@ class RecipeDetailSerializer(serializers.ModelSerializer):
             'cooking_time_minutes', 'difficulty', 'main_image',
             'recipe_ingredients', 
             'dietary_tags', 'status', 'cuisine_type',
-            'steps', 'is_favorited'
+            'steps', 'is_favorited',
+            'rating_count', 'rating_average', 'rating_histogram'
         )
         read_only_fields = fields
 
-    def get_is_favorited(self, obj):
-        user = self.context.get('request').user
-        if user and user.is_authenticated:
-            return obj in user.favorite_recipes.all()
-        return False
+    def get_rating_histogram(self, obj):
+        # 各星级的评价数，形如 {"1": 0, ..., "5": 12}
+        return {str(rating): getattr(obj, rating_histogram_field(rating)) for rating in RATING_VALUES}
 
 class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
     """用于在创建菜谱时，接收食材数据的内部序列化器"""
@@ -111,10 +186,52 @@ class RecipeIngredientCreateSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
         fields = ('ingredient_id', 'quantity', 'unit', 'notes')
 
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise serializers.ValidationError("用量必须大于 0。")
+        return value
+
+class RecipeStepCreateSerializer(serializers.ModelSerializer):
+    """用于在创建菜谱时，接收步骤数据的内部序列化器"""
+
+    class Meta:
+        model = RecipeStep
+        fields = ('step_number', 'description')
+
+class JSONListField(serializers.ListField):
+    """
+    列表字段，同时接受 JSON 数组和 JSON 数组字符串。
+    上传主图时请求是 multipart 表单，ingredients_data / steps_data 只能以 JSON 字符串提交。
+    """
+
+    def get_value(self, dictionary):
+        if html.is_html_input(dictionary):
+            return dictionary.get(self.field_name, empty)
+        return super().get_value(dictionary)
+
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            try:
+                data = json.loads(data)
+            except ValueError:
+                raise serializers.ValidationError("不是有效的 JSON。")
+        return super().to_internal_value(data)
+
+    def run_child_validation(self, data):
+        # PATCH 时根序列化器的 partial=True 会经 parent 链作用到子序列化器的字段上，缺少必填项的行会被放过；
+        # 列表整体提交时每一行都是完整数据，按非 partial 校验
+        root = self.root
+        partial = getattr(root, 'partial', False)
+        root.partial = False
+        try:
+            return super().run_child_validation(data)
+        finally:
+            root.partial = partial
+
 class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
     """用于创建和更新菜谱的序列化器 (已优化)"""
-    ingredients_data = serializers.CharField(write_only=True)
-    steps_data = serializers.CharField(write_only=True, required=False)
+    ingredients_data = JSONListField(child=RecipeIngredientCreateSerializer(), write_only=True)
+    steps_data = JSONListField(child=RecipeStepCreateSerializer(), write_only=True, required=False)
     
     dietary_tags = serializers.PrimaryKeyRelatedField(
         queryset=DietaryPreferenceTag.objects.all(),
@@ -131,12 +248,33 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
             'ingredients_data', 'steps_data', 'author_username'
         )
 
+    def validate_ingredients_data(self, value):
+        ingredient_ids = [data['ingredient_id'] for data in value]
+        if len(set(ingredient_ids)) != len(ingredient_ids):
+            raise serializers.ValidationError("同一食材不能重复添加。")
+        # 所有引用的食材一次 IN 查询校验，避免写到一半才因外键失败
+        existing_ids = set(Ingredient.objects.filter(id__in=ingredient_ids).values_list('id', flat=True))
+        missing_ids = sorted(set(ingredient_ids) - existing_ids)
+        if missing_ids:
+            raise serializers.ValidationError(f"食材不存在: {', '.join(map(str, missing_ids))}")
+        return value
+
+    def validate_steps_data(self, value):
+        step_numbers = [data['step_number'] for data in value]
+        if len(set(step_numbers)) != len(step_numbers):
+            raise serializers.ValidationError("步骤序号不能重复。")
+        return value
+
+    @transaction.atomic
     def create(self, validated_data):
-        ingredients_data = json.loads(validated_data.pop('ingredients_data'))
-        steps_data = json.loads(validated_data.pop('steps_data', '[]'))
+        """菜谱、标签、食材、步骤在同一事务中写入，任何一步失败都不会留下半成品菜谱。"""
+        ingredients_data = validated_data.pop('ingredients_data')
+        steps_data = validated_data.pop('steps_data', [])
         dietary_tags = validated_data.pop('dietary_tags', [])
         
-        recipe = Recipe.objects.create(**validated_data)
+        recipe = Recipe(**validated_data)
+        recipe.set_ingredient_summary(data['ingredient_id'] for data in ingredients_data)
+        recipe.save()
         
         if dietary_tags:
             recipe.dietary_tags.set(dietary_tags)
@@ -148,28 +286,74 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         if recipe_steps:
             RecipeStep.objects.bulk_create(recipe_steps)
 
+        # bulk_create 不触发信号；上面 recipe.save() 的信号登记的刷新 (匹配索引、搜索文本、版本号) 在提交后才执行，
+        # 届时读到的已是这里写入的食材与步骤
+
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        """
+        食材与步骤按差异更新：只改动变化的行 (bulk_update)、插入新增的行、删除去掉的行，
+        行 ID 保持不变。查询数量固定，与菜谱的食材、步骤数量无关：删除时逐行触发的 post_delete 信号
+        只登记待办，提交后按菜谱合并处理 (见 signals.py)。
+        """
         if 'ingredients_data' in validated_data:
-            ingredients_data = json.loads(validated_data.pop('ingredients_data'))
-            instance.recipeingredient_set.all().delete()
-            recipe_ingredients = [RecipeIngredient(recipe=instance, ingredient_id=data['ingredient_id'], quantity=data['quantity'], unit=data['unit'], notes=data.get('notes', '')) for data in ingredients_data]
-            RecipeIngredient.objects.bulk_create(recipe_ingredients)
+            ingredients_data = validated_data.pop('ingredients_data')
+            self._apply_ingredient_changes(instance, ingredients_data)
+            # 冗余字段随下面 super().update() 的 save 一起写入
+            instance.set_ingredient_summary(data['ingredient_id'] for data in ingredients_data)
 
         if 'steps_data' in validated_data:
-            steps_data = json.loads(validated_data.pop('steps_data'))
-            instance.steps.all().delete()
-            recipe_steps = [RecipeStep(recipe=instance, **data) for data in steps_data]
-            if recipe_steps:
-                RecipeStep.objects.bulk_create(recipe_steps)
+            steps_data = validated_data.pop('steps_data')
+            self._apply_step_changes(instance, steps_data)
         
         if 'dietary_tags' in validated_data:
             dietary_tags_data = validated_data.pop('dietary_tags')
             instance.dietary_tags.set(dietary_tags_data)
 
+        # 最后保存菜谱本身：其 post_save 信号会按数据库中的最新食材刷新匹配索引与搜索文本
         return super().update(instance, validated_data)
 
+    def _apply_ingredient_changes(self, recipe, ingredients_data):
+        """同一菜谱内食材唯一，按 ingredient_id 对比现有行。"""
+        existing = {row.ingredient_id: row for row in recipe.recipeingredient_set.all()}
+        to_create, to_update = [], []
+        for data in ingredients_data:
+            quantity, unit, notes = data['quantity'], data['unit'], data.get('notes', '')
+            row = existing.pop(data['ingredient_id'], None)
+            if row is None:
+                to_create.append(RecipeIngredient(recipe=recipe, ingredient_id=data['ingredient_id'], quantity=quantity, unit=unit, notes=notes))
+            elif (row.quantity, row.unit, row.notes or '') != (float(quantity), unit, notes or ''):
+                row.quantity, row.unit, row.notes = quantity, unit, notes
+                to_update.append(row)
+
+        if existing:
+            RecipeIngredient.objects.filter(pk__in=[row.pk for row in existing.values()]).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['quantity', 'unit', 'notes'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+
+    def _apply_step_changes(self, recipe, steps_data):
+        """同一菜谱内步骤序号唯一，按 step_number 对比现有行；已上传的步骤图片保留。"""
+        existing = {step.step_number: step for step in recipe.steps.all()}
+        to_create, to_update = [], []
+        for data in steps_data:
+            step = existing.pop(data['step_number'], None)
+            if step is None:
+                to_create.append(RecipeStep(recipe=recipe, **data))
+            elif step.description != data['description']:
+                step.description = data['description']
+                to_update.append(step)
+
+        if existing:
+            RecipeStep.objects.filter(pk__in=[step.pk for step in existing.values()]).delete()
+        if to_update:
+            RecipeStep.objects.bulk_update(to_update, ['description'])
+        if to_create:
+            RecipeStep.objects.bulk_create(to_create)
+
 class ReviewSerializer(serializers.ModelSerializer):
     """用于评价的创建、列表和详情"""
     user_username = serializers.CharField(source='user.username', read_only=True)
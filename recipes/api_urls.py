@@ -16,6 +16,9 @@ urlpatterns = [
     
     # 单独为 dietary-tags 定义路径
     path('dietary-tags/', api_views.DietaryPreferenceTagListView.as_view(), name='dietary-tag-list'),
+
+    # 食材 / 菜谱名称的前缀 (拼音) 补全
+    path('autocomplete/', api_views.AutocompleteView.as_view(), name='autocomplete'),
     
     # 评价的列表和创建
     path('recipes/<int:recipe_pk>/reviews/', api_views.ReviewViewSet.as_view({
@@ -1,26 +1,73 @@
 # recipes/api_views.py (最终版)
 
+import heapq
+import json
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_etags, quote_etag
 from rest_framework import generics, permissions, viewsets, status
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Count, Q, F, FloatField, ExpressionWrapper
-from django.db.models.functions import Coalesce
+from django.db.models import Count, Exists, Max, OuterRef, Q, Subquery, Value
 from rest_framework import serializers
-from .models import Ingredient, DietaryPreferenceTag, Recipe, RecipeIngredient, Review
-from users.models import UserInventoryItem, ShoppingListItem
+from .models import Ingredient, DietaryPreferenceTag, Recipe, Review
+from users.inventory import get_inventory_vector
 from .api_serializers import (
     IngredientSerializer,
     DietaryPreferenceTagSerializer,
     RecipeListSerializer,
+    RecipeMatchSerializer,
+    RecipeBatchMatchSerializer,
     RecipeDetailSerializer,
     RecipeCreateUpdateSerializer,
     ReviewSerializer,
-    RecipeSimpleSerializer 
+    RecipeSimpleSerializer,
+    ShoppingListBatchSerializer,
+    ShoppingListMultiplierSerializer,
 )
 from .permissions import IsOwnerOrReadOnly
+from .filters import RecipeFilter, RecipeOrderingFilter, RecipeSearchFilter, tag_exists
+from .eligibility import get_user_eligibility
+from .matching import recipe_match_index, MatchResults
+from .substitutes import substitute_graph
+from .autocomplete import KINDS as AUTOCOMPLETE_KINDS, autocomplete_index
+from .snapshots import ingredient_catalogue_snapshot
+from .response_cache import cache_anonymous_response
+from .shopping import add_recipes_to_shopping_list
+from .versions import DIETARY_TAGS, INGREDIENT_CATALOGUE, get_versions
+from .pagination import (
+    KeysetPaginationMixin,
+    MatchKeysetPagination,
+    RecipeKeysetPagination,
+    ReviewKeysetPagination,
+)
+
+
+def conditional_get(request, etag, last_modified, render):
+    """
+    条件 GET：If-None-Match (及给出 last_modified 时的 If-Modified-Since) 命中时返回 304，否则调用 render() 生成完整响应。
+    两种情况都带上 ETag (及 Last-Modified)。响应可能因用户而异 (收藏状态)，要求客户端每次重新验证。
+    """
+    timestamp = int(last_modified.timestamp()) if last_modified is not None else None
+    response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if response is None:
+        response = render()
+    if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+        response['Cache-Control'] = 'private, no-cache'
+        patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def _microseconds(value):
+    return int(value.timestamp() * 1000000) if value is not None else 0
 
 
 class IngredientListView(generics.ListAPIView):
@@ -43,23 +90,29 @@ class DietaryPreferenceTagListView(generics.ListAPIView):
     ordering = ['name']
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all().select_related('author').prefetch_related(
-        'dietary_tags',
-        'recipeingredient_set__ingredient'
-    )
-    permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
-    filterset_fields = {
-        'cooking_time_minutes': ['lte', 'gte', 'exact'],
-        'difficulty': ['exact'],
-        'cuisine_type': ['exact', 'icontains'],
-        'author__username': ['exact'],
-        'dietary_tags__name': ['exact', 'in'],
+class RecipeViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
+    queryset = Recipe.objects.all().select_related('author')
+    # 每个 action 需要预取的关联，与对应序列化器实际读取的字段保持一致。
+    # 食材替代品不在此列：由进程内的 substitute_graph 提供，不产生查询。
+    prefetch_plan = {
+        'list': ['dietary_tags'],
+        'favorites': ['dietary_tags'],
+        'from_inventory': ['dietary_tags'],
+        'retrieve': ['dietary_tags', 'steps', 'recipeingredient_set__ingredient'],
     }
-    search_fields = ['title', 'description', 'ingredients__name', 'dietary_tags__name']
-    ordering_fields = ['cooking_time_minutes', 'difficulty', 'updated_at', 'title']
+    permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    # 跨关联的筛选写成 EXISTS 子查询，搜索只查 search_document 列，查询集无需 distinct()。
+    # 搜索在未指定 ?ordering= 时按相关度排序，需排在 OrderingFilter 之后。
+    # ordering 另支持 popular (收藏数) 与 trending (热度) 两个别名，见 RecipeOrderingFilter。
+    filter_backends = [DjangoFilterBackend, RecipeOrderingFilter, RecipeSearchFilter]
+    filterset_class = RecipeFilter
+    # 仅作说明 (可搜索 API 页面与接口文档使用)：实际搜索范围见 search.build_search_document
+    search_fields = ['title', 'description', 'steps__description', 'ingredients__name', 'dietary_tags__name']
+    ordering_fields = ['cooking_time_minutes', 'difficulty', 'updated_at', 'title', 'rating_average', 'rating_count']
     ordering = ['-updated_at']
+    keyset_pagination_class = RecipeKeysetPagination
+
+    MATCH_MODES = ('exact', 'substitutes')
 
     def get_serializer_class(self):
         if self.action == 'list' or self.action == 'favorites': # 让 favorites action 也用 ListSerializer
@@ -68,8 +121,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateUpdateSerializer
         return RecipeDetailSerializer
 
+    def get_prefetched_queryset(self, queryset=None):
+        """按当前 action 的预取计划附加 prefetch_related。"""
+        if queryset is None:
+            queryset = self.queryset
+        return queryset.prefetch_related(*self.prefetch_plan.get(self.action, []))
+
     def get_queryset(self):
-        queryset = self.queryset
+        queryset = self.get_prefetched_queryset()
         user = self.request.user
 
         if user.is_authenticated:
@@ -79,23 +138,80 @@ class RecipeViewSet(viewsets.ModelViewSet):
         else:
             queryset = queryset.filter(status='published')
 
-        if user.is_authenticated and user.disliked_ingredients.exists():
-            user_disliked_ids = list(user.disliked_ingredients.values_list('id', flat=True))
-            queryset = queryset.exclude(ingredients__id__in=user_disliked_ids)
-            
-        exclude_ingredients_str = self.request.query_params.get('exclude_ingredients')
-        if exclude_ingredients_str:
-            exclude_ingredient_ids = []
-            try:
-                id_list = [s for s in exclude_ingredients_str.split(',') if s.strip()]
-                exclude_ingredient_ids = [int(id_str.strip()) for id_str in id_list]
-            except ValueError:
-                pass
-            if exclude_ingredient_ids:
-                queryset = queryset.exclude(ingredients__id__in=exclude_ingredient_ids)
+        # 不吃的食材与饮食偏好来自按用户缓存的 eligibility，不再为此单独查询
+        eligibility = self.get_user_eligibility()
+        # 食材相关的筛选都走 Recipe.ingredient_ids 冗余列，单表查询，无需 JOIN
+        if eligibility.disliked_ids:
+            queryset = queryset.exclude(ingredient_ids__overlap=list(eligibility.disliked_ids))
+        if self.applies_dietary_preferences():
+            for tag_id in eligibility.preferred_tag_ids:
+                queryset = queryset.filter(tag_exists(pk=tag_id))
+
+        exclude_ingredient_ids = self._parse_id_list_param('exclude_ingredients')
+        if exclude_ingredient_ids:
+            queryset = queryset.exclude(ingredient_ids__overlap=exclude_ingredient_ids)
 
-        return queryset.distinct()
+        # 必须包含的食材 (全部包含)
+        include_ingredient_ids = self._parse_id_list_param('include_ingredients')
+        if include_ingredient_ids:
+            queryset = queryset.filter(ingredient_ids__contains=include_ingredient_ids)
 
+        return queryset
+
+    def get_user_eligibility(self):
+        if not hasattr(self, '_eligibility'):
+            self._eligibility = get_user_eligibility(self.request.user)
+        return self._eligibility
+
+    def applies_dietary_preferences(self):
+        """?apply_preferences=true 时只返回带有用户全部饮食偏好标签的菜谱。"""
+        return self.request.query_params.get('apply_preferences', '').lower() in ['true', '1', 't']
+
+    def _parse_id_list_param(self, name):
+        """解析逗号分隔的 ID 列表参数，格式不正确 (含非正整数) 时忽略该参数。"""
+        value = self.request.query_params.get(name)
+        if not value:
+            return []
+        try:
+            ids = [int(id_str.strip()) for id_str in value.split(',') if id_str.strip()]
+        except ValueError:
+            return []
+        if any(id_value <= 0 for id_value in ids):
+            return []
+        return ids
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        支持条件请求：先用一次轻量查询取本菜谱的更新时间、评价状态 (及当前用户的收藏状态) 生成 ETag，
+        客户端缓存仍然有效时直接返回 304，不做预取与序列化。
+        详情不带 Last-Modified：评分统计、收藏状态等变化不会改变菜谱的更新时间，按秒比较的 If-Modified-Since 会误判。
+        """
+        state = self.get_queryset().filter(pk=kwargs['pk']).values('id', 'updated_at', 'rating_count').annotate(
+            reviews_updated_at=Subquery(
+                Review.objects.filter(recipe_id=OuterRef('pk')).order_by('-updated_at').values('updated_at')[:1]
+            ),
+            favorited=Exists(Recipe.favorited_by.through.objects.filter(recipe_id=OuterRef('pk'), user_id=request.user.pk))
+            if request.user.is_authenticated else Value(False),
+        ).first()
+        if state is None:
+            return self._cached_retrieve(request, *args, **kwargs)
+        # 评价的增删改会更新评分统计 (不改菜谱的更新时间)；详情中的食材、饮食标签改名时只递增各自的版本号
+        versions = get_versions([INGREDIENT_CATALOGUE, DIETARY_TAGS])
+        etag = quote_etag('recipe-{}-{}-{}-{}-{}-{}-{}'.format(
+            kwargs['pk'], _microseconds(state['updated_at']), _microseconds(state['reviews_updated_at']),
+            state['rating_count'], versions[INGREDIENT_CATALOGUE], versions[DIETARY_TAGS], int(state['favorited'])
+        ))
+        # 匿名响应缓存同样按本菜谱的状态区分，不随菜谱目录版本号整体失效
+        self.response_cache_version = etag
+        # 收藏状态已经查出，序列化时不再重复查询 (见 get_serializer_context)
+        self.favorite_recipe_ids = frozenset([state['id']]) if state['favorited'] else frozenset()
+        return conditional_get(request, etag, None, lambda: self._cached_retrieve(request, *args, **kwargs))
+
+    @cache_anonymous_response
+    def _cached_retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
+    @cache_anonymous_response
     def list(self, request, *args, **kwargs):
         queryset = self.filter_queryset(self.get_queryset())
         available_ingredients_str = request.query_params.get('available_ingredients')
@@ -107,21 +223,18 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 try:
                     id_list = [s for s in available_ingredients_str.split(',') if s.strip()]
                     available_ingredient_ids = [int(id_str.strip()) for id_str in id_list]
+                    if any(ingredient_id <= 0 for ingredient_id in available_ingredient_ids):
+                        raise ValueError
                 except ValueError:
-                    return Response({"error": "无效的 available_ingredients 参数格式。应为逗号分隔的ID。"}, status=status.HTTP_400_BAD_REQUEST)
+                    return Response({"error": "无效的 available_ingredients 参数格式。应为逗号分隔的正整数ID。"}, status=status.HTTP_400_BAD_REQUEST)
+
+                match_mode = self._get_match_mode()
+                if match_mode is None:
+                    return self._invalid_match_mode_response()
 
                 if available_ingredient_ids:
-                    queryset = queryset.annotate(
-                        total_ingredients=Coalesce(Count('ingredients', distinct=True), 0),
-                        matched_ingredients=Coalesce(Count('ingredients', filter=Q(ingredients__id__in=available_ingredient_ids), distinct=True), 0)
-                    ).annotate(
-                        match_score=ExpressionWrapper(
-                            F('matched_ingredients') * 1.0 / F('total_ingredients'),
-                            output_field=FloatField()
-                        )
-                    ).filter(total_ingredients__gt=0, match_score__gt=0).order_by('-match_score', '-updated_at')
-                else:
-                    queryset = queryset.none()
+                    return self._list_matches(queryset, available_ingredient_ids, match_mode)
+                queryset = queryset.none()
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -131,31 +244,125 @@ class RecipeViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data)
 
+    def _get_match_mode(self):
+        match_mode = self.request.query_params.get('match_mode', 'exact')
+        return match_mode if match_mode in self.MATCH_MODES else None
+
+    def _invalid_match_mode_response(self):
+        return Response({"error": "无效的 match_mode 参数，可选值为 exact 或 substitutes。"}, status=status.HTTP_400_BAD_REQUEST)
+
+    def _list_matches(self, queryset, available_ingredient_ids, match_mode='exact'):
+        """
+        用进程内的倒排索引打分并做 top-K 选择，数据库只取回当前页的菜谱。
+        queryset 仅用于确定哪些菜谱对当前用户可见 (权限、筛选、搜索)。
+        match_mode=substitutes 时，已有食材的替代品也计入匹配，但权重较低。
+        """
+        max_missing_str = self.request.query_params.get('max_missing')
+        max_missing = None
+        if max_missing_str:
+            try:
+                max_missing = int(max_missing_str)
+            except ValueError:
+                return Response({"error": "无效的 max_missing 参数，应为非负整数。"}, status=status.HTTP_400_BAD_REQUEST)
+            if max_missing < 0:
+                return Response({"error": "无效的 max_missing 参数，应为非负整数。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        substitute_ids = set()
+        if match_mode == 'substitutes':
+            substitute_ids = substitute_graph.covered_by(available_ingredient_ids)
+        matches = recipe_match_index.match(
+            available_ingredient_ids,
+            substitute_ids=substitute_ids,
+            substitute_weight=settings.SUBSTITUTE_MATCH_WEIGHT if substitute_ids else 0.0,
+            max_missing=max_missing,
+        )
+        # 先在内存中剔除用户不可用的菜谱，缩小回查数据库的 ID 列表
+        eligibility = self.get_user_eligibility()
+        apply_preferences = self.applies_dietary_preferences()
+        if eligibility.excludes_any(apply_preferences):
+            matches = [match for match in matches if not eligibility.is_excluded(match.recipe_id, apply_preferences)]
+        results = MatchResults.for_queryset(queryset, matches)
+        paginator = MatchKeysetPagination() if self.use_keyset_pagination() else self.paginator
+        page = paginator.paginate_queryset(results, self.request, view=self) if paginator is not None else None
+        recipes = self._hydrate_matches(page if page is not None else results[:])
+
+        context = self.get_serializer_context()
+        include_missing = self.request.query_params.get('include_missing', '').lower() in ['true', '1', 't']
+        if include_missing:
+            self._attach_missing_ingredients(recipes, set(available_ingredient_ids) | substitute_ids)
+            context['include_missing'] = True
+        serializer = RecipeMatchSerializer(recipes, many=True, context=context)
+        if page is not None:
+            return paginator.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
+    def _hydrate_matches(self, matches):
+        recipes_by_id = self.get_prefetched_queryset().in_bulk([match.recipe_id for match in matches])
+        recipes = []
+        for match in matches:
+            recipe = recipes_by_id.get(match.recipe_id)
+            if recipe is None:
+                continue
+            recipe.matched_ingredients = match.matched
+            recipe.substituted_ingredients = match.substituted
+            recipe.total_ingredients = match.total
+            recipe.missing_ingredients_count = match.missing
+            recipe.match_score = match.score
+            recipes.append(recipe)
+        return recipes
+
+    def _attach_missing_ingredients(self, recipes, covered_ingredient_ids):
+        """缺少的食材 ID 来自内存索引，名称用一次查询批量取回。"""
+        missing_by_recipe = {
+            recipe.pk: recipe_match_index.missing_ingredient_ids(recipe.pk, covered_ingredient_ids)
+            for recipe in recipes
+        }
+        all_missing_ids = set().union(*missing_by_recipe.values())
+        names = dict(Ingredient.objects.filter(id__in=all_missing_ids).values_list('id', 'name')) if all_missing_ids else {}
+        for recipe in recipes:
+            recipe.missing_ingredients = [
+                {'id': ingredient_id, 'name': names.get(ingredient_id)}
+                for ingredient_id in missing_by_recipe[recipe.pk]
+            ]
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def add_to_shopping_list(self, request, pk=None):
         recipe = self.get_object()
-        user = request.user
-        required_ingredients = RecipeIngredient.objects.filter(recipe=recipe)
-        required_ingredient_ids = required_ingredients.values_list('ingredient_id', flat=True)
-        inventory_ingredient_ids = UserInventoryItem.objects.filter(user=user).values_list('ingredient_id', flat=True)
-        shopping_list_ingredient_ids = ShoppingListItem.objects.filter(user=user).values_list('ingredient_id', flat=True)
-        needed_ingredient_ids = set(required_ingredient_ids) - set(inventory_ingredient_ids) - set(shopping_list_ingredient_ids)
-        if not needed_ingredient_ids:
-            return Response({"detail": "太棒了！该菜谱所需食材您都已拥有或已在购物清单中。"}, status=status.HTTP_200_OK)
-        items_to_create = [
-            ShoppingListItem(
-                user=user,
-                ingredient_id=item.ingredient_id,
-                quantity=item.quantity,
-                unit=item.unit,
-                related_recipe=recipe
-            ) for item in required_ingredients.filter(ingredient_id__in=needed_ingredient_ids)
-        ]
-        ShoppingListItem.objects.bulk_create(items_to_create)
-        return Response({"detail": f"成功将 {len(items_to_create)} 种缺少的食材添加到了您的购物清单。"}, status=status.HTTP_201_CREATED)
+        serializer = ShoppingListMultiplierSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        created, merged = add_recipes_to_shopping_list(request.user, {recipe.pk: serializer.validated_data['multiplier']})
+        return self._shopping_list_response(created, merged, "太棒了！该菜谱所需食材您都已拥有。")
+
+    @action(detail=False, methods=['post'], url_path='add-to-shopping-list', permission_classes=[permissions.IsAuthenticated])
+    def add_batch_to_shopping_list(self, request):
+        """
+        把多个菜谱 (可带份量倍数) 缺少的食材一次合并进购物清单，同一食材的用量按单位累加。
+        请求体：{"recipes": [{"recipe_id": 1, "multiplier": 2}, ...]}
+        """
+        serializer = ShoppingListBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        multipliers = serializer.validated_data['recipes']
+        visible_ids = set(self.get_queryset().filter(pk__in=multipliers).order_by().values_list('id', flat=True))
+        unknown_ids = sorted(set(multipliers) - visible_ids)
+        if unknown_ids:
+            return Response({"error": f"菜谱不存在或不可见: {unknown_ids}"}, status=status.HTTP_400_BAD_REQUEST)
+        created, merged = add_recipes_to_shopping_list(request.user, multipliers)
+        return self._shopping_list_response(created, merged, "太棒了！这些菜谱所需食材您都已拥有。")
+
+    def _shopping_list_response(self, created, merged, nothing_needed_message):
+        if not created and not merged:
+            return Response({"detail": nothing_needed_message}, status=status.HTTP_200_OK)
+        return Response(
+            {
+                "detail": f"成功将 {created + merged} 种缺少的食材添加到了您的购物清单。",
+                "created": created,
+                "merged": merged,
+            },
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
 
     @action(detail=True, methods=['post', 'delete'], permission_classes=[permissions.IsAuthenticated])
     def favorite(self, request, pk=None):
@@ -168,11 +375,70 @@ class RecipeViewSet(viewsets.ModelViewSet):
             user.favorite_recipes.remove(recipe)
             return Response({'status': 'unfavorited'}, status=status.HTTP_204_NO_CONTENT)
 
+    @action(detail=False, methods=['get'], url_path='from-inventory', permission_classes=[permissions.IsAuthenticated])
+    def from_inventory(self, request):
+        """根据当前用户库存中的食材推荐菜谱，客户端无需再回传食材 ID 列表。"""
+        match_mode = self._get_match_mode()
+        if match_mode is None:
+            return self._invalid_match_mode_response()
+        queryset = self.filter_queryset(self.get_queryset())
+        inventory_ingredient_ids = get_inventory_vector(request.user)
+        return self._list_matches(queryset, inventory_ingredient_ids, match_mode)
+
+    @action(detail=False, methods=['post'], url_path='match-batch', permission_classes=[permissions.IsAuthenticated])
+    def match_batch(self, request):
+        """
+        一次请求为多组食材各返回匹配度最高的 top_k 个菜谱，以 JSON Lines 流式返回 (每组一行)。
+        所有食材组都在内存索引上打分；可见菜谱及其标题只查询一次，相同的食材组只计算一次。
+        """
+        serializer = RecipeBatchMatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        baskets = serializer.validated_data['baskets']
+        top_k = serializer.validated_data['top_k']
+        match_mode = serializer.validated_data['match_mode']
+
+        visible = {
+            recipe_id: (updated_at, title)
+            for recipe_id, updated_at, title in self.filter_queryset(self.get_queryset()).order_by().values_list('id', 'updated_at', 'title')
+        }
+        substitute_weight = settings.SUBSTITUTE_MATCH_WEIGHT if match_mode == 'substitutes' else 0.0
+
+        def rank(basket):
+            substitute_ids = substitute_graph.covered_by(basket) if substitute_weight else ()
+            # 批量请求的食材组大多只出现一次，不经过匹配结果缓存，以免挤掉交互请求的缓存
+            matches = recipe_match_index.match(basket, substitute_ids=substitute_ids, substitute_weight=substitute_weight, cached=False)
+            top = heapq.nlargest(
+                top_k,
+                (match for match in matches if match.recipe_id in visible),
+                key=lambda match: (match.score, visible[match.recipe_id][0], match.recipe_id)
+            )
+            return [
+                {
+                    'id': match.recipe_id,
+                    'title': visible[match.recipe_id][1],
+                    'match_score': match.score,
+                    'matched_count': match.matched,
+                    'substituted_count': match.substituted,
+                    'missing_count': match.missing,
+                }
+                for match in top
+            ]
+
+        def stream():
+            ranked = {}
+            for index, basket in enumerate(baskets):
+                key = frozenset(basket)
+                if key not in ranked:
+                    ranked[key] = rank(key)
+                yield json.dumps({'basket': index, 'results': ranked[key]}, ensure_ascii=False) + '\n'
+
+        return StreamingHttpResponse(stream(), content_type='application/x-ndjson')
+
     @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def favorites(self, request):
         """返回当前用户收藏的所有菜谱。"""
         user = request.user
-        favorited_recipes = user.favorite_recipes.all()
+        favorited_recipes = self.get_prefetched_queryset(user.favorite_recipes.select_related('author'))
         page = self.paginate_queryset(favorited_recipes)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -181,12 +447,17 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
     def get_serializer_context(self):
-        return {'request': self.request}
+        context = {'request': self.request}
+        favorite_recipe_ids = getattr(self, 'favorite_recipe_ids', None)
+        if favorite_recipe_ids is not None:
+            context['favorite_recipe_ids'] = favorite_recipe_ids
+        return context
 
-class ReviewViewSet(viewsets.ModelViewSet):
-    queryset = Review.objects.all()
+class ReviewViewSet(KeysetPaginationMixin, viewsets.ModelViewSet):
+    queryset = Review.objects.select_related('user')
     serializer_class = ReviewSerializer
     permission_classes = [IsAuthenticatedOrReadOnly, IsOwnerOrReadOnly]
+    keyset_pagination_class = ReviewKeysetPagination
 
     def get_queryset(self):
         recipe_pk = self.kwargs.get('recipe_pk')
@@ -194,6 +465,20 @@ class ReviewViewSet(viewsets.ModelViewSet):
             return self.queryset.filter(recipe_id=recipe_pk)
         return super().get_queryset()
 
+    def list(self, request, *args, **kwargs):
+        """
+        评价数量与最近的更新时间 (一次聚合查询) 未变时返回 304。
+        不带 Last-Modified：删除一条较早的评价不会改变最近的更新时间，按秒比较的 If-Modified-Since 会误判，
+        只依靠包含评价数量的 ETag。
+        """
+        state = self.filter_queryset(self.get_queryset()).aggregate(count=Count('id'), last_modified=Max('updated_at'))
+        if state['last_modified'] is None:
+            return super().list(request, *args, **kwargs)
+        etag = quote_etag('reviews-{}-{}-{}'.format(
+            self.kwargs.get('recipe_pk', ''), state['count'], _microseconds(state['last_modified'])
+        ))
+        return conditional_get(request, etag, None, lambda: super(ReviewViewSet, self).list(request, *args, **kwargs))
+
     def perform_create(self, serializer):
         recipe_pk = self.kwargs.get('recipe_pk')
         try:
@@ -224,6 +509,32 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     ordering_fields = ['name', 'category']
     ordering = ['name']
 
+    def list(self, request, *args, **kwargs):
+        """
+        无搜索/排序参数的 JSON 请求直接返回预渲染的快照，完全跳过序列化；
+        客户端带上 If-None-Match 且版本未变时返回 304。
+        """
+        if request.accepted_renderer.format != 'json' or any(
+            param in request.query_params for param in ('search', 'ordering')
+        ):
+            return super().list(request, *args, **kwargs)
+
+        version, body, gzipped_body = ingredient_catalogue_snapshot.get()
+        use_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        etag = f'"ingredients-{version}-gzip"' if use_gzip else f'"ingredients-{version}"'
+
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(gzipped_body if use_gzip else body, content_type='application/json')
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        return response
+
     @action(detail=True, methods=['get'])
     def substitutes(self, request, pk=None):
         ingredient = self.get_object()
@@ -241,4 +552,30 @@ class RecipeSimpleListView(generics.ListAPIView):
     queryset = Recipe.objects.filter(status='published').order_by('title')
     serializer_class = RecipeSimpleSerializer
     permission_classes = [permissions.IsAuthenticated] # 只有登录用户可以浏览
-    pagination_class = None
\ No newline at end of file
+    pagination_class = None
+
+class AutocompleteView(generics.GenericAPIView):
+    """
+    食材名 / 菜谱标题的前缀补全，支持拼音全拼与首字母 (如 xhs -> 西红柿)。
+    参数：q (必填)、type (ingredient 或 recipe，不传则两者都返回)、limit (默认 10，最大 50)。
+    数据来自进程内的 autocomplete_index，不查询数据库。
+    """
+    permission_classes = [permissions.AllowAny]
+    pagination_class = None
+    default_limit = 10
+    max_limit = 50
+
+    def get(self, request):
+        prefix = request.query_params.get('q', '')
+        kind = request.query_params.get('type')
+        if kind is not None and kind not in AUTOCOMPLETE_KINDS:
+            return Response({"error": "无效的 type 参数，可选值为 ingredient 或 recipe。"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get('limit', self.default_limit))
+        except ValueError:
+            return Response({"error": "无效的 limit 参数，应为正整数。"}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({"error": "无效的 limit 参数，应为正整数。"}, status=status.HTTP_400_BAD_REQUEST)
+
+        kinds = (kind,) if kind else AUTOCOMPLETE_KINDS
+        return Response(autocomplete_index.suggest(prefix, kinds=kinds, limit=min(limit, self.max_limit)))
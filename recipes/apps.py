@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class RecipesConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "recipes"
+
+    def ready(self):
+        # 注册模型信号 (维护进程内的匹配索引) 与部署检查
+        from . import checks, signals  # noqa: F401
@@ -0,0 +1,146 @@
+# recipes/autocomplete.py
+"""
+食材名与菜谱标题的前缀补全索引。
+
+前端的食材选择器原先只能整表下载食材列表再本地过滤。这里在进程内为每种类型维护一个有序数组，
+元素为 (检索键, 命中方式, ID)，检索键包括名称本身以及名称的拼音全拼、拼音首字母
+(需要安装 pypinyin，未安装时只支持按名称前缀补全)。前缀查询用二分查找定位，
+只扫描有限个候选，与数据量无关。
+索引在首次使用时构建，之后由 signals.py 在食材/菜谱保存或删除、事务提交后增量刷新，
+其他进程的修改通过版本号发现 (见 indexes.py)。
+"""
+
+from bisect import bisect_left, insort
+
+from .indexes import VersionedIndex
+from .models import Ingredient, Recipe
+from .versions import AUTOCOMPLETE_INDEX
+
+try:
+    from pypinyin import Style, lazy_pinyin
+except ImportError:  # pragma: no cover - 可选依赖
+    lazy_pinyin = None
+
+INGREDIENT = 'ingredient'
+RECIPE = 'recipe'
+KINDS = (INGREDIENT, RECIPE)
+
+# 名称前缀命中优先于拼音命中
+_MATCH_PRIORITY = {'name': 0, 'pinyin': 1, 'initials': 2}
+
+
+def name_keys(name):
+    """返回名称的检索键 [(键, 命中方式)]：名称本身、拼音全拼、拼音首字母 (均为小写、去空白)。"""
+    normalized = ''.join(name.lower().split())
+    keys = [(normalized, 'name')]
+    if lazy_pinyin is not None and normalized:
+        full = ''.join(lazy_pinyin(normalized))
+        initials = ''.join(lazy_pinyin(normalized, style=Style.FIRST_LETTER))
+        if full != normalized:
+            keys.append((full, 'pinyin'))
+        if initials not in (normalized, full):
+            keys.append((initials, 'initials'))
+    return keys
+
+
+class AutocompleteIndex(VersionedIndex):
+    """增量刷新以 (类型, ID) 为单位。"""
+
+    version_name = AUTOCOMPLETE_INDEX
+    # 单次查询最多检查的候选条目数 (排序前)，保证短前缀 (如单个字母) 时查询时间有上界
+    MAX_SCAN = 500
+
+    def __init__(self):
+        super().__init__()
+        self._entries = {kind: [] for kind in KINDS}  # kind -> 有序的 (key, match_type, id)
+        self._names = {}  # (kind, id) -> 名称
+
+    def _build(self):
+        names = {}
+        for ingredient_id, name in Ingredient.objects.values_list('id', 'name').iterator():
+            names[(INGREDIENT, ingredient_id)] = name
+        for recipe_id, title in Recipe.objects.filter(status='published').values_list('id', 'title').iterator():
+            names[(RECIPE, recipe_id)] = title
+        entries = {kind: [] for kind in KINDS}
+        for (kind, item_id), name in names.items():
+            entries[kind].extend((key, match_type, item_id) for key, match_type in name_keys(name))
+        for kind_entries in entries.values():
+            kind_entries.sort()
+        self._entries = entries
+        self._names = names
+
+    def _reset(self):
+        self._entries = {kind: [] for kind in KINDS}
+        self._names = {}
+
+    # ---- 增量刷新 (有序数组写时复制，读线程无需加锁) ----
+
+    def _refresh(self, keys):
+        """从数据库重新读取这些 (类型, ID) 的名称；已删除的食材、已删除或未发布的菜谱从索引中移除。"""
+        ids = {kind: [item_id for item_kind, item_id in keys if item_kind == kind] for kind in KINDS}
+        names = {}
+        if ids[INGREDIENT]:
+            for ingredient_id, name in Ingredient.objects.filter(pk__in=ids[INGREDIENT]).values_list('id', 'name'):
+                names[(INGREDIENT, ingredient_id)] = name
+        if ids[RECIPE]:
+            recipes = Recipe.objects.filter(pk__in=ids[RECIPE], status='published').values_list('id', 'title')
+            for recipe_id, title in recipes:
+                names[(RECIPE, recipe_id)] = title
+        for kind, item_id in keys:
+            self._set(kind, item_id, names.get((kind, item_id)))
+
+    def _set(self, kind, item_id, name):
+        old_name = self._names.get((kind, item_id))
+        if old_name == name:
+            return
+        entries = list(self._entries[kind])
+        if old_name is not None:
+            for key, match_type in name_keys(old_name):
+                index = bisect_left(entries, (key, match_type, item_id))
+                if index < len(entries) and entries[index] == (key, match_type, item_id):
+                    del entries[index]
+        names = dict(self._names)
+        if name is None:
+            names.pop((kind, item_id), None)
+        else:
+            names[(kind, item_id)] = name
+            for key, match_type in name_keys(name):
+                insort(entries, (key, match_type, item_id))
+        self._entries = {**self._entries, kind: entries}
+        self._names = names
+
+    # ---- 查询 ----
+
+    def suggest(self, prefix, kinds=KINDS, limit=10):
+        """
+        返回前缀匹配的前 limit 条建议 [{'type', 'id', 'name'}]。
+        排序：名称前缀命中优先于拼音命中，其次名称越短越靠前。
+        """
+        self.ensure_built()
+        prefix = ''.join(prefix.lower().split())
+        if not prefix:
+            return []
+        names = self._names
+
+        best = {}
+        for kind in kinds:
+            entries = self._entries[kind]
+            index = bisect_left(entries, (prefix,))
+            end = min(len(entries), index + self.MAX_SCAN)
+            while index < end:
+                key, match_type, item_id = entries[index]
+                if not key.startswith(prefix):
+                    break
+                index += 1
+                name = names.get((kind, item_id))
+                if name is None:
+                    continue
+                rank = (_MATCH_PRIORITY[match_type], len(name), name, kind, item_id)
+                if (kind, item_id) not in best or rank < best[(kind, item_id)]:
+                    best[(kind, item_id)] = rank
+
+        ranked = sorted(best.values())[:limit]
+        return [{'type': kind, 'id': item_id, 'name': name} for _, _, name, kind, item_id in ranked]
+
+
+autocomplete_index = AutocompleteIndex()
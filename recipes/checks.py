@@ -0,0 +1,23 @@
+# recipes/checks.py
+"""系统检查：部署配置中缓存后端必须在 worker 进程之间共享。"""
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+# 只在单个进程内有效的缓存后端
+PROCESS_LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(deploy=True)
+def check_shared_cache(app_configs, **kwargs):
+    backend = settings.CACHES.get('default', {}).get('BACKEND')
+    if backend in PROCESS_LOCAL_CACHE_BACKENDS:
+        return [Warning(
+            f"CACHES['default'] 使用了进程内的缓存后端 {backend}。",
+            hint="响应缓存、eligibility 与库存向量的失效只对当前进程可见，多进程部署请使用数据库缓存、Redis 或 Memcached。",
+            id='recipes.W001',
+        )]
+    return []
@@ -0,0 +1,95 @@
+# recipes/eligibility.py
+"""
+每个用户的“可推荐菜谱”条件。
+
+登录用户的每次列表请求原本都要先查一次不吃的食材，再拼进主查询；饮食偏好则完全没用上。
+这里把与用户相关的排除条件集中起来：
+    - disliked_ids: 不吃的食材 ID (列表查询直接用于 ingredient_ids__overlap 排除)；
+    - preferred_tag_ids: 饮食偏好标签 ID；
+    - disliked_recipe_ids: 含有不吃食材的菜谱 ID (匹配时在内存中剔除)；
+    - preferred_recipe_ids: 带有全部偏好标签的菜谱 ID (仅 apply_preferences=true 时用到)。
+前两项是用户自己的数据，按用户缓存在 Django 缓存中，用户修改偏好 (或相关食材、标签被删除) 时由信号删除。
+后两项在首次使用时才计算：disliked_recipe_ids 直接取自内存匹配索引 (随 MATCH_INDEX 版本号同步)；
+preferred_recipe_ids 只取决于偏好标签组合与菜谱的标签，按 (标签组合, RECIPE_TAGS 版本号) 缓存，
+偏好相同的用户共用一份。
+"""
+
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count
+from django.utils.functional import cached_property
+
+from .matching import recipe_match_index
+from .models import Recipe
+from .versions import RECIPE_TAGS, get_version
+
+ELIGIBILITY_TIMEOUT = 60 * 60
+
+
+class UserEligibility:
+
+    def __init__(self, disliked_ids=(), preferred_tag_ids=()):
+        self.disliked_ids = disliked_ids
+        self.preferred_tag_ids = preferred_tag_ids
+
+    @cached_property
+    def disliked_recipe_ids(self):
+        if not self.disliked_ids:
+            return frozenset()
+        return frozenset(recipe_match_index.recipes_with_any(self.disliked_ids))
+
+    @cached_property
+    def preferred_recipe_ids(self):
+        return get_recipes_with_tags(self.preferred_tag_ids)
+
+    def excludes_any(self, apply_preferences=False):
+        return bool(self.disliked_ids or (apply_preferences and self.preferred_tag_ids))
+
+    def is_excluded(self, recipe_id, apply_preferences=False):
+        if recipe_id in self.disliked_recipe_ids:
+            return True
+        return bool(apply_preferences and self.preferred_tag_ids and recipe_id not in self.preferred_recipe_ids)
+
+
+EMPTY_ELIGIBILITY = UserEligibility()
+
+
+def _eligibility_key(user_id):
+    return f'recipes:eligibility:{user_id}'
+
+
+def get_user_eligibility(user):
+    if not user.is_authenticated:
+        return EMPTY_ELIGIBILITY
+    key = _eligibility_key(user.pk)
+    cached = cache.get(key)
+    if cached is None:
+        cached = (
+            tuple(sorted(user.disliked_ingredients.values_list('id', flat=True))),
+            tuple(sorted(user.dietary_preferences.values_list('id', flat=True))),
+        )
+        cache.set(key, cached, ELIGIBILITY_TIMEOUT)
+    return UserEligibility(*cached)
+
+
+def invalidate_user_eligibility(user_id):
+    cache.delete(_eligibility_key(user_id))
+
+
+def get_recipes_with_tags(tag_ids):
+    """返回带有 tag_ids 中全部标签的菜谱 ID 集合。"""
+    if not tag_ids:
+        return frozenset()
+    tag_ids = sorted(set(tag_ids))
+    digest = hashlib.md5(','.join(map(str, tag_ids)).encode('ascii')).hexdigest()
+    key = f'recipes:tagged:{get_version(RECIPE_TAGS)}:{digest}'
+    recipe_ids = cache.get(key)
+    if recipe_ids is None:
+        recipe_ids = frozenset(
+            Recipe.dietary_tags.through.objects.filter(dietarypreferencetag_id__in=tag_ids)
+            .values('recipe_id').annotate(tag_count=Count('dietarypreferencetag_id'))
+            .filter(tag_count=len(tag_ids)).values_list('recipe_id', flat=True)
+        )
+        cache.set(key, recipe_ids, ELIGIBILITY_TIMEOUT)
+    return recipe_ids
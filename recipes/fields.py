@@ -0,0 +1,93 @@
+# recipes/fields.py
+"""
+整数 ID 列表字段：PostgreSQL 上使用 ArrayField (配合 GIN 索引)，
+其他数据库 (本地开发用的 SQLite) 退化为 JSON 数组存储。
+
+两种实现都支持 overlap (有交集) 与 contains (包含全部) 查询，
+因此调用方可以统一写 `ingredient_ids__overlap=[...]`，无需关心后端。
+
+另外提供搜索列的三元组 (pg_trgm) GIN 索引，同样只在 PostgreSQL 上创建。
+"""
+
+from django.db import NotSupportedError, connection, models
+from django.db.models import F, Lookup
+
+USE_POSTGRES_ARRAY = connection.vendor == 'postgresql'
+
+
+class IdListField(models.JSONField):
+    """以 JSON 数组存储的整数 ID 列表 (ArrayField 的非 PostgreSQL 替代)。"""
+
+
+class IdListLookup(Lookup):
+    prepare_rhs = False
+
+    def as_sql(self, compiler, connection):
+        raise NotSupportedError(f"'{self.lookup_name}' 查询目前只支持 PostgreSQL 与 SQLite。")
+
+    def _sqlite_parts(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        ids = sorted({int(value) for value in self.rhs})
+        placeholders = ', '.join(['%s'] * len(ids))
+        return lhs, list(lhs_params), ids, placeholders
+
+
+@IdListField.register_lookup
+class IdListOverlap(IdListLookup):
+    """列表与给定 ID 至少有一个交集。"""
+    lookup_name = 'overlap'
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params, ids, placeholders = self._sqlite_parts(compiler, connection)
+        if not ids:
+            return '0 = 1', []
+        sql = f'EXISTS (SELECT 1 FROM json_each({lhs}) WHERE json_each.value IN ({placeholders}))'
+        return sql, params + ids
+
+
+@IdListField.register_lookup
+class IdListContains(IdListLookup):
+    """列表包含给定的全部 ID。"""
+    lookup_name = 'contains'
+
+    def as_sqlite(self, compiler, connection):
+        lhs, params, ids, placeholders = self._sqlite_parts(compiler, connection)
+        if not ids:
+            return '1 = 1', []
+        sql = (
+            f'(SELECT COUNT(DISTINCT json_each.value) FROM json_each({lhs}) '
+            f'WHERE json_each.value IN ({placeholders})) = %s'
+        )
+        return sql, params + ids + [len(ids)]
+
+
+def id_list_field(**kwargs):
+    """按当前数据库返回合适的 ID 列表字段。"""
+    if USE_POSTGRES_ARRAY:
+        from django.contrib.postgres.fields import ArrayField
+        return ArrayField(models.BigIntegerField(), **kwargs)
+    return IdListField(**kwargs)
+
+
+def id_list_indexes(field_name, index_name):
+    """ID 列表字段的索引：PostgreSQL 上为 GIN 索引，其他数据库不建索引。"""
+    if USE_POSTGRES_ARRAY:
+        from django.contrib.postgres.indexes import GinIndex
+        return [GinIndex(fields=[field_name], name=index_name)]
+    return []
+
+
+def trigram_indexes(field_name, index_name):
+    """文本列的 pg_trgm GIN 索引 (加速 LIKE '%...%')：PostgreSQL 上创建，其他数据库不建索引。"""
+    if USE_POSTGRES_ARRAY:
+        from django.contrib.postgres.indexes import GinIndex, OpClass
+        return [GinIndex(OpClass(F(field_name), name='gin_trgm_ops'), name=index_name)]
+    return []
+
+
+def trigram_extension_operations():
+    """启用 pg_trgm 扩展的迁移操作 (仅 PostgreSQL)。"""
+    if USE_POSTGRES_ARRAY:
+        from django.contrib.postgres.operations import TrigramExtension
+        return [TrigramExtension()]
+    return []
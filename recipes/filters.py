@@ -0,0 +1,114 @@
+# recipes/filters.py
+"""
+菜谱列表的筛选与搜索。
+
+跨多对多关联的条件 (饮食标签) 一律写成 EXISTS 子查询，全文搜索只查冗余的 search_document 列，
+主查询不 JOIN 关联表，也就不会产生重复行，不需要 DISTINCT 去重。
+"""
+
+import heapq
+
+import django_filters
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from rest_framework.filters import OrderingFilter, SearchFilter
+from rest_framework.settings import api_settings
+
+from .models import Recipe
+from .search import USE_TRIGRAM_SEARCH, needs_bigram_index, recipe_search_index
+
+
+class CharInFilter(django_filters.BaseInFilter, django_filters.CharFilter):
+    pass
+
+
+def tag_exists(**tag_lookup):
+    return Exists(Recipe.dietary_tags.through.objects.filter(
+        recipe_id=OuterRef('pk'),
+        **{f'dietarypreferencetag__{key}': value for key, value in tag_lookup.items()}
+    ))
+
+
+class RecipeFilter(django_filters.FilterSet):
+    dietary_tags__name = django_filters.CharFilter(method='filter_dietary_tag')
+    dietary_tags__name__in = CharInFilter(method='filter_dietary_tag_in')
+
+    class Meta:
+        model = Recipe
+        fields = {
+            'cooking_time_minutes': ['lte', 'gte', 'exact'],
+            'difficulty': ['exact'],
+            'cuisine_type': ['exact', 'icontains'],
+            'author__username': ['exact'],
+            'rating_average': ['gte', 'lte'],
+            'rating_count': ['gte'],
+        }
+
+    def filter_dietary_tag(self, queryset, name, value):
+        return queryset.filter(tag_exists(name=value))
+
+    def filter_dietary_tag_in(self, queryset, name, value):
+        return queryset.filter(tag_exists(name__in=value))
+
+
+class RecipeSearchFilter(SearchFilter):
+    """
+    菜谱全文搜索 (参数与 SearchFilter 相同：?search=，空格分隔的多个词须全部命中)。
+    搜索的是 Recipe.search_document，不 JOIN 关联表：PostgreSQL 上走 pg_trgm GIN 索引
+    (1~2 个字符的短词先由进程内索引给出候选)，其他数据库由进程内的 bigram 索引 (search.recipe_search_index) 给出候选菜谱。
+    未指定 ?ordering= 时按相关度排序，因此应放在 OrderingFilter 之后。
+    """
+    ordering_param = api_settings.ORDERING_PARAM
+    # 进程内索引只对得分最高的这些菜谱按相关度排序，其余排在后面、按更新时间排序
+    rank_limit = 1000
+
+    def filter_queryset(self, request, queryset, view):
+        search_terms = self.get_search_terms(request)
+        if not search_terms:
+            return queryset
+        rank = self.ordering_param not in request.query_params
+
+        if USE_TRIGRAM_SEARCH:
+            # 1~2 个字符的词用不上三元组索引，先由进程内 bigram 索引缩小到候选菜谱 (见 search.py)
+            short_terms = [term for term in search_terms if needs_bigram_index(term)]
+            if short_terms:
+                queryset = queryset.filter(pk__in=list(recipe_search_index.search(short_terms)))
+            for term in search_terms:
+                queryset = queryset.filter(search_document__contains=term.lower())
+            if rank:
+                from django.contrib.postgres.search import TrigramWordSimilarity
+                similarity = TrigramWordSimilarity(' '.join(search_terms).lower(), 'search_document')
+                queryset = queryset.annotate(search_rank=similarity).order_by('-search_rank', '-updated_at', '-id')
+            return queryset
+
+        scores = recipe_search_index.search(search_terms)
+        queryset = queryset.filter(pk__in=list(scores))
+        if rank and scores:
+            ranked = heapq.nlargest(self.rank_limit, scores, key=lambda recipe_id: (scores[recipe_id], recipe_id))
+            position = Case(
+                *[When(pk=recipe_id, then=Value(index)) for index, recipe_id in enumerate(ranked)],
+                default=Value(len(ranked)),
+                output_field=IntegerField(),
+            )
+            queryset = queryset.annotate(search_rank=position).order_by('search_rank', '-updated_at', '-id')
+        return queryset
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    在 ordering_fields 之外支持两个别名 (均有对应的索引)：
+        ordering=popular  -> 收藏数倒序
+        ordering=trending -> 热度倒序 (见 popularity.py)
+    """
+    ordering_aliases = {
+        'popular': ['-favorite_count', '-id'],
+        'trending': ['-trending_score', '-id'],
+    }
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        ordering = []
+        for field in fields:
+            if field in self.ordering_aliases:
+                ordering.extend(self.ordering_aliases[field])
+            else:
+                ordering.extend(super().remove_invalid_fields(queryset, [field], view, request))
+        return ordering
@@ -0,0 +1,89 @@
+# recipes/indexes.py
+"""
+进程内索引 (匹配索引、替代关系图、搜索索引、补全索引) 的公共基类，负责与数据库及其他 worker 进程保持同步。
+
+    - 数据变化时由 signals.py 调用 schedule_refresh(keys)，事务提交后才从数据库重新读取这些条目，
+      回滚的写入不会进入索引；同一事务内的多次调用合并为一次刷新。
+    - 每个索引有自己的版本号 (versions.py)。本进程刷新后递增版本号，其他进程在 ensure_built 中
+      发现版本号变化就整体重建 (最多每 INDEX_VERSION_CHECK_INTERVAL 秒检查一次)。
+    - 本进程递增得到的版本号恰好是“已同步的版本号 + 1”时，说明期间没有其他进程写入，
+      本进程的索引无需重建。
+子类实现 _build() (全量构建)、_reset() (清空) 与 _refresh(keys) (增量刷新，在锁内调用)。
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.db import transaction
+
+from .versions import bump_version, get_version, schedule_bump
+
+
+class VersionedIndex:
+    version_name = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._version = None
+        self._checked_at = 0.0
+        self._pending = threading.local()
+
+    def ensure_built(self):
+        if self._built and time.monotonic() - self._checked_at < settings.INDEX_VERSION_CHECK_INTERVAL:
+            return
+        with self._lock:
+            # 先读版本号再读数据：构建期间其他进程的写入会让版本号再次变化，下次检查时重建
+            version = get_version(self.version_name)
+            self._checked_at = time.monotonic()
+            if self._built and version == self._version:
+                return
+            self._build()
+            self._version = version
+            self._built = True
+
+    def invalidate(self):
+        """丢弃本进程的索引，下次使用时重新构建；事务提交后递增版本号，其他进程也随之重建 (用于绕过信号的批量写入)。"""
+        with self._lock:
+            self._built = False
+            self._version = None
+            self._reset()
+        schedule_bump(self.version_name)
+
+    def schedule_refresh(self, keys):
+        """在当前事务提交后从数据库刷新 keys 对应的条目 (不在事务中时立即刷新)。"""
+        pending = getattr(self._pending, 'keys', None)
+        if pending is None:
+            pending = self._pending.keys = set()
+        pending.update(keys)
+        transaction.on_commit(self._flush_pending)
+
+    def _flush_pending(self):
+        keys = getattr(self._pending, 'keys', None)
+        if not keys:
+            return
+        self._pending.keys = set()
+        self.refresh(keys)
+
+    def refresh(self, keys):
+        """立即从数据库刷新 keys 对应的条目并递增版本号，应在事务提交后调用。"""
+        with self._lock:
+            built = self._built
+            if built:
+                self._refresh(keys)
+            version = bump_version(self.version_name)
+            if built and self._version is not None and version == self._version + 1:
+                self._version = version
+            else:
+                # 期间其他进程也有写入，下次使用时检查版本号并重建
+                self._checked_at = 0.0
+
+    def _build(self):
+        raise NotImplementedError
+
+    def _reset(self):
+        raise NotImplementedError
+
+    def _refresh(self, keys):
+        raise NotImplementedError
@@ -0,0 +1,54 @@
+# recipes/management/commands/benchmark_units.py
+
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.units import UNIT_CONVERSIONS, convert_many
+
+
+class Command(BaseCommand):
+    help = 'Measures the throughput of recipes.units.convert_many on synthetic rows (no database access).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1_000_000, help='Number of quantities to convert per run.')
+        parser.add_argument('--ingredients', type=int, default=2000, help='Number of distinct ingredients in the sample.')
+        parser.add_argument(
+            '--profiled',
+            type=float,
+            default=0.3,
+            help='Fraction of ingredients that have a density / piece weight.',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Number of timed runs; the best one is reported.')
+
+    def handle(self, *args, **options):
+        rows = options['rows']
+        ingredients = options['ingredients']
+        if rows < 1 or ingredients < 1 or options['repeat'] < 1:
+            raise CommandError('--rows, --ingredients and --repeat must be positive.')
+        if not 0 <= options['profiled'] <= 1:
+            raise CommandError('--profiled must be between 0 and 1.')
+
+        rng = random.Random(0)
+        units = list(UNIT_CONVERSIONS) + ['slice', 'pinch', 'to_taste']
+        profiles = {
+            ingredient_id: (rng.uniform(0.5, 1.5), rng.uniform(5, 300))
+            for ingredient_id in range(ingredients)
+            if rng.random() < options['profiled']
+        }
+        sample_quantities = [rng.uniform(0.1, 500) for _ in range(rows)]
+        sample_units = [rng.choice(units) for _ in range(rows)]
+        sample_ingredients = [rng.randrange(ingredients) for _ in range(rows)]
+
+        for label, ingredient_ids, run_profiles in (
+            ('unit factors only', None, None),
+            ('with ingredient profiles', sample_ingredients, profiles),
+        ):
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                convert_many(sample_quantities, sample_units, ingredient_ids, run_profiles)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(f'{label}: {rows} rows in {best:.3f}s ({rows / best / 1e6:.2f}M rows/s)')
@@ -0,0 +1,28 @@
+# recipes/management/commands/fold_trending_scores.py
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.popularity import fold_trending_windows
+from recipes.versions import RECIPE_CATALOGUE, bump_version
+
+
+class Command(BaseCommand):
+    help = 'Closes the current trending window by decaying Recipe.trending_score. Run periodically (e.g. hourly from cron).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--decay',
+            type=float,
+            default=None,
+            help=f'Decay factor applied to trending scores (default: settings.TRENDING_DECAY = {settings.TRENDING_DECAY}).',
+        )
+
+    def handle(self, *args, **options):
+        decay = options['decay']
+        if decay is not None and not 0 <= decay <= 1:
+            raise CommandError('--decay must be between 0 and 1.')
+        updated = fold_trending_windows(decay)
+        # ordering=trending 的缓存响应随之失效
+        bump_version(RECIPE_CATALOGUE)
+        self.stdout.write(self.style.SUCCESS(f'Folded trending window: {updated} recipe(s) updated.'))
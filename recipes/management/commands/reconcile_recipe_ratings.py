@@ -0,0 +1,22 @@
+# recipes/management/commands/reconcile_recipe_ratings.py
+
+from django.core.management.base import BaseCommand
+
+from recipes.ratings import reconcile_recipe_ratings
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the denormalized rating aggregates on Recipe from the Review table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'recipe_ids',
+            nargs='*',
+            type=int,
+            help='Only reconcile these recipes (default: all recipes).',
+        )
+
+    def handle(self, *args, **options):
+        recipe_ids = options['recipe_ids'] or None
+        changed = reconcile_recipe_ratings(recipe_ids)
+        self.stdout.write(self.style.SUCCESS(f'Reconciled rating aggregates: {changed} recipe(s) corrected.'))
@@ -5,6 +5,7 @@ from django.core.management.base import BaseCommand
 from django.db import transaction, IntegrityError
 from django.contrib.auth import get_user_model
 from recipes.models import Recipe, Ingredient, RecipeIngredient, RecipeStep, Review
+from recipes.search import schedule_search_refresh
 
 User = get_user_model()
 
@@ -455,5 +456,6 @@ class Command(BaseCommand):
             
             if ingredients_to_create:
                 RecipeIngredient.objects.bulk_create(ingredients_to_create)
+            schedule_search_refresh([recipe.pk])
 
         self.stdout.write(self.style.SUCCESS('Database seeding completed successfully!'))
\ No newline at end of file
@@ -0,0 +1,253 @@
+# recipes/matching.py
+"""
+菜谱-食材匹配的进程内倒排索引。
+
+“根据已有食材推荐菜谱”原先在数据库里对整个菜谱表做两次 Count 聚合再排序，
+这里改为在内存中维护：
+    - 每个菜谱的食材集合，用 Python int 作为位图 (第 N 位代表食材 ID N)；
+    - 食材 -> 菜谱 的倒排表，每个倒排表是有序的 int 数组。
+索引在首次使用时从 RecipeIngredient 构建，之后由 signals.py 中的模型信号在事务提交后增量刷新，
+其他进程的修改通过版本号发现 (见 indexes.py)。
+匹配打分和 top-K 选择在内存中完成，数据库只负责取回当前页的菜谱。
+"""
+
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict, namedtuple
+from collections.abc import Sequence
+
+from .indexes import VersionedIndex
+from .models import RecipeIngredient
+from .versions import MATCH_INDEX
+
+
+class RecipeMatch(namedtuple('RecipeMatch', ['recipe_id', 'matched', 'total', 'score', 'substituted'], defaults=[0])):
+    """matched: 直接拥有的食材数；substituted: 仅能通过替代品覆盖的食材数。"""
+    __slots__ = ()
+
+    @property
+    def missing(self):
+        return self.total - self.matched - self.substituted
+
+
+def _match_sort_key(item):
+    match, updated_at = item
+    return (match.score, updated_at, match.recipe_id)
+
+
+class RecipeMatchIndex(VersionedIndex):
+    """食材 -> 菜谱 的倒排索引 (每个进程一份)。增量刷新以菜谱 ID 为单位。"""
+
+    version_name = MATCH_INDEX
+    MATCH_CACHE_SIZE = 256
+
+    def __init__(self):
+        super().__init__()
+        self._recipe_masks = {}   # recipe_id -> 食材位图
+        self._recipe_totals = {}  # recipe_id -> 食材数量
+        self._postings = {}       # ingredient_id -> array('q')，有序的菜谱 ID
+        # 最近的匹配结果 (例如同一份库存反复查询)，索引有任何变化即清空
+        self._match_cache = OrderedDict()
+
+    # ---- 构建与刷新 ----
+
+    def _build(self):
+        masks = {}
+        postings = {}
+        rows = RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id').order_by('recipe_id')
+        for recipe_id, ingredient_id in rows.iterator():
+            masks[recipe_id] = masks.get(recipe_id, 0) | (1 << ingredient_id)
+            postings.setdefault(ingredient_id, []).append(recipe_id)
+        self._recipe_masks = masks
+        self._recipe_totals = {recipe_id: mask.bit_count() for recipe_id, mask in masks.items()}
+        self._postings = {
+            ingredient_id: array('q', sorted(set(recipe_ids)))
+            for ingredient_id, recipe_ids in postings.items()
+        }
+        self._match_cache = OrderedDict()
+
+    def _reset(self):
+        self._recipe_masks = {}
+        self._recipe_totals = {}
+        self._postings = {}
+        self._match_cache = OrderedDict()
+
+    def _refresh(self, recipe_ids):
+        """从数据库重新读取这些菜谱的食材集合 (已删除的菜谱从索引中移除)。"""
+        masks = dict.fromkeys(recipe_ids, 0)
+        rows = RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list('recipe_id', 'ingredient_id')
+        for recipe_id, ingredient_id in rows:
+            masks[recipe_id] |= 1 << ingredient_id
+        for recipe_id, mask in masks.items():
+            self._set_mask(recipe_id, mask)
+
+    def _set_mask(self, recipe_id, new_mask):
+        old_mask = self._recipe_masks.get(recipe_id, 0)
+        if new_mask == old_mask:
+            return
+        self._match_cache = OrderedDict()
+        for ingredient_id in _bits(old_mask & ~new_mask):
+            self._remove_posting(ingredient_id, recipe_id)
+        for ingredient_id in _bits(new_mask & ~old_mask):
+            self._add_posting(ingredient_id, recipe_id)
+        if new_mask:
+            self._recipe_masks[recipe_id] = new_mask
+            self._recipe_totals[recipe_id] = new_mask.bit_count()
+        else:
+            self._recipe_masks.pop(recipe_id, None)
+            self._recipe_totals.pop(recipe_id, None)
+
+    # 倒排表采用写时复制，读线程无需加锁即可安全遍历旧数组。
+    def _add_posting(self, ingredient_id, recipe_id):
+        posting = array('q', self._postings.get(ingredient_id, ()))
+        pos = bisect_left(posting, recipe_id)
+        if pos == len(posting) or posting[pos] != recipe_id:
+            posting.insert(pos, recipe_id)
+        self._postings[ingredient_id] = posting
+
+    def _remove_posting(self, ingredient_id, recipe_id):
+        posting = self._postings.get(ingredient_id)
+        if posting is None:
+            return
+        pos = bisect_left(posting, recipe_id)
+        if pos < len(posting) and posting[pos] == recipe_id:
+            posting = array('q', posting)
+            del posting[pos]
+            if posting:
+                self._postings[ingredient_id] = posting
+            else:
+                self._postings.pop(ingredient_id, None)
+
+    # ---- 查询 ----
+
+    def match(self, available_ingredient_ids, substitute_ids=(), substitute_weight=0.0, max_missing=None, cached=True):
+        """
+        返回至少命中一种食材的所有菜谱的匹配结果 (未排序)。
+        只遍历相关食材的倒排表，不会扫描整个菜谱目录。
+
+        substitute_ids 为可通过替代品覆盖的食材 (不应与可用食材重叠)，
+        每覆盖一种按 substitute_weight 计分，而直接拥有的食材计 1 分。
+        max_missing 不为 None 时，丢弃缺少食材数超过该值的菜谱。
+        cached=False 时直接打分，不读写结果缓存 (批量匹配等一次性查询，避免挤掉交互请求的缓存结果)。
+        """
+        if cached:
+            matches = self._cached_match(available_ingredient_ids, substitute_ids, substitute_weight)
+        else:
+            self.ensure_built()
+            matches = self._score(available_ingredient_ids, substitute_ids, substitute_weight)
+        if max_missing is not None:
+            matches = [match for match in matches if match.missing <= max_missing]
+        return matches
+
+    def _cached_match(self, available_ingredient_ids, substitute_ids, substitute_weight):
+        self.ensure_built()
+        cache_key = (frozenset(available_ingredient_ids), frozenset(substitute_ids), substitute_weight)
+        match_cache = self._match_cache
+        matches = match_cache.get(cache_key)
+        if matches is None:
+            matches = self._score(available_ingredient_ids, substitute_ids, substitute_weight)
+            with self._lock:
+                if match_cache is self._match_cache:
+                    match_cache[cache_key] = matches
+                    if len(match_cache) > self.MATCH_CACHE_SIZE:
+                        match_cache.popitem(last=False)
+        return matches
+
+    def _score(self, available_ingredient_ids, substitute_ids, substitute_weight):
+        matched_counts = self._count_postings(available_ingredient_ids)
+        substituted_counts = self._count_postings(substitute_ids) if substitute_weight > 0 else Counter()
+        totals = self._recipe_totals
+        matches = []
+        for recipe_id in matched_counts.keys() | substituted_counts.keys():
+            total = totals.get(recipe_id)
+            if not total:
+                continue
+            matched = matched_counts.get(recipe_id, 0)
+            substituted = substituted_counts.get(recipe_id, 0)
+            score = (matched + substitute_weight * substituted) / total
+            matches.append(RecipeMatch(recipe_id, matched, total, score, substituted))
+        return matches
+
+    def missing_ingredient_ids(self, recipe_id, covered_ingredient_ids):
+        """返回菜谱中未被 covered_ingredient_ids 覆盖的食材 ID (升序)。"""
+        self.ensure_built()
+        # covered_ingredient_ids 可能来自客户端参数，不能拿来移位构造位图 (负数报错、极大的 ID 占满内存)
+        covered = set(covered_ingredient_ids)
+        return [ingredient_id for ingredient_id in _bits(self._recipe_masks.get(recipe_id, 0)) if ingredient_id not in covered]
+
+    def recipes_with_any(self, ingredient_ids):
+        """返回至少包含其中一种食材的菜谱 ID 集合。"""
+        self.ensure_built()
+        postings = self._postings
+        recipe_ids = set()
+        for ingredient_id in set(ingredient_ids):
+            recipe_ids.update(postings.get(ingredient_id, ()))
+        return recipe_ids
+
+    def _count_postings(self, ingredient_ids):
+        postings = self._postings
+        counts = Counter()
+        for ingredient_id in set(ingredient_ids):
+            posting = postings.get(ingredient_id)
+            if posting is not None:
+                counts.update(posting)
+        return counts
+
+
+def _bits(mask):
+    """依次返回位图中置位的下标。"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class MatchResults(Sequence):
+    """
+    按 (匹配度, 更新时间, ID) 倒序排列的惰性结果序列。
+    分页器切片时才用 heapq.nlargest 做 top-K 选择，不对全部候选排序。
+    元素为 (RecipeMatch, updated_at) 二元组。
+    """
+
+    def __init__(self, items):
+        self._items = items
+
+    @classmethod
+    def for_queryset(cls, queryset, matches):
+        """只保留 queryset (已应用权限与筛选条件) 中可见的菜谱。"""
+        if not matches:
+            return cls([])
+        by_id = {match.recipe_id: match for match in matches}
+        visible = queryset.filter(id__in=list(by_id)).order_by().values_list('id', 'updated_at')
+        return cls([(by_id[recipe_id], updated_at) for recipe_id, updated_at in visible])
+
+    def __len__(self):
+        return len(self._items)
+
+    def top_after(self, position, limit):
+        """
+        返回排序键严格小于 position 的前 limit 个元素，形如 [(RecipeMatch, 排序键)]。
+        position 为 None 时从头开始。用于键集分页。
+        """
+        items = self._items
+        if position is not None:
+            items = [item for item in items if _match_sort_key(item) < position]
+        top = heapq.nlargest(limit, items, key=_match_sort_key)
+        return [(item[0], _match_sort_key(item)) for item in top]
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self._items))
+            if start >= stop:
+                return []
+            top = heapq.nlargest(stop, self._items, key=_match_sort_key)
+            return [match for match, _ in top[start:stop:step]]
+        if index < 0:
+            index += len(self._items)
+        if not 0 <= index < len(self._items):
+            raise IndexError('MatchResults index out of range')
+        return self[index:index + 1][0]
+
+
+recipe_match_index = RecipeMatchIndex()
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:23
+
+from django.db import migrations, models
+
+import recipes.fields
+
+
+def backfill_ingredient_summary(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+
+    ids_by_recipe = {}
+    for recipe_id, ingredient_id in RecipeIngredient.objects.values_list("recipe_id", "ingredient_id"):
+        ids_by_recipe.setdefault(recipe_id, set()).add(ingredient_id)
+
+    recipes = list(Recipe.objects.only("id"))
+    for recipe in recipes:
+        ids = sorted(ids_by_recipe.get(recipe.id, ()))
+        recipe.ingredient_ids = ids
+        recipe.ingredient_count = len(ids)
+    Recipe.objects.bulk_update(recipes, ["ingredient_ids", "ingredient_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0007_alter_recipeingredient_unit"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="ingredient_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="食材数量"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="ingredient_ids",
+            field=recipes.fields.id_list_field(blank=True, default=list, editable=False, verbose_name="食材ID列表"),
+        ),
+        *[
+            migrations.AddIndex(model_name="recipe", index=index)
+            for index in recipes.fields.id_list_indexes("ingredient_ids", "recipe_ingredient_ids_gin")
+        ],
+        migrations.RunPython(backfill_ingredient_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0008_recipe_ingredient_count_recipe_ingredient_ids"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["-updated_at", "-id"], name="recipe_updated_id_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="review",
+            index=models.Index(fields=["recipe", "-created_at", "-id"], name="review_recipe_created_id_idx"),
+        ),
+    ]
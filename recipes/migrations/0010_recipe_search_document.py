@@ -0,0 +1,46 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:36
+
+from django.db import migrations, models
+
+import recipes.fields
+
+
+def backfill_search_document(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    RecipeStep = apps.get_model("recipes", "RecipeStep")
+    RecipeIngredient = apps.get_model("recipes", "RecipeIngredient")
+
+    texts = {}
+    for recipe_id, description in RecipeStep.objects.order_by("step_number").values_list("recipe_id", "description"):
+        texts.setdefault(recipe_id, []).append(description)
+    for recipe_id, name in RecipeIngredient.objects.values_list("recipe_id", "ingredient__name"):
+        texts.setdefault(recipe_id, []).append(name)
+    for recipe_id, name in Recipe.dietary_tags.through.objects.values_list("recipe_id", "dietarypreferencetag__name"):
+        texts.setdefault(recipe_id, []).append(name)
+
+    recipes = list(Recipe.objects.only("id", "title", "description"))
+    for recipe in recipes:
+        parts = [recipe.title or "", recipe.description or "", *texts.get(recipe.id, ())]
+        recipe.search_document = "\n".join(part for part in parts if part).lower()
+    Recipe.objects.bulk_update(recipes, ["search_document"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0009_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        *recipes.fields.trigram_extension_operations(),
+        migrations.AddField(
+            model_name="recipe",
+            name="search_document",
+            field=models.TextField(blank=True, default="", editable=False, verbose_name="搜索文本"),
+        ),
+        *[
+            migrations.AddIndex(model_name="recipe", index=index)
+            for index in recipes.fields.trigram_indexes("search_document", "recipe_search_document_trgm")
+        ],
+        migrations.RunPython(backfill_search_document, migrations.RunPython.noop),
+    ]
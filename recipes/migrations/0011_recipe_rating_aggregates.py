@@ -0,0 +1,79 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:42
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def backfill_rating_aggregates(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    Review = apps.get_model("recipes", "Review")
+
+    rows = Review.objects.values("recipe_id").order_by().annotate(
+        count=Count("id"),
+        total=Sum("rating"),
+        **{f"rating_{rating}": Count("id", filter=Q(rating=rating)) for rating in range(1, 6)},
+    )
+    recipes = []
+    for row in rows:
+        recipe = Recipe(pk=row["recipe_id"], rating_count=row["count"], rating_sum=row["total"])
+        recipe.rating_average = row["total"] / row["count"]
+        for rating in range(1, 6):
+            setattr(recipe, f"rating_{rating}", row[f"rating_{rating}"])
+        recipes.append(recipe)
+    fields = ["rating_count", "rating_sum", "rating_average"] + [f"rating_{rating}" for rating in range(1, 6)]
+    Recipe.objects.bulk_update(recipes, fields, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0010_recipe_search_document"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_1",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="1星评价数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_2",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="2星评价数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_3",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="3星评价数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_4",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="4星评价数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_5",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="5星评价数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_average",
+            field=models.FloatField(default=0.0, editable=False, verbose_name="平均评分"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="评价数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="rating_sum",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="评分总和"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["-rating_average", "-rating_count"], name="recipe_rating_average_idx"),
+        ),
+        migrations.RunPython(backfill_rating_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:44
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_favorite_count(apps, schema_editor):
+    Recipe = apps.get_model("recipes", "Recipe")
+    User = apps.get_model("users", "User")
+    Favorite = User.favorite_recipes.through
+
+    rows = Favorite.objects.values("recipe_id").order_by().annotate(count=Count("id"))
+    recipes = [Recipe(pk=row["recipe_id"], favorite_count=row["count"]) for row in rows]
+    Recipe.objects.bulk_update(recipes, ["favorite_count"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0011_recipe_rating_aggregates"),
+        ("users", "0005_user_favorite_recipes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="favorite_count",
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name="收藏数"),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="trending_score",
+            field=models.FloatField(default=0.0, editable=False, verbose_name="热度"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["-favorite_count", "-id"], name="recipe_favorite_count_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(fields=["-trending_score", "-id"], name="recipe_trending_score_idx"),
+        ),
+        migrations.RunPython(backfill_favorite_count, migrations.RunPython.noop),
+    ]
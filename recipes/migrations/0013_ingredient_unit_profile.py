@@ -0,0 +1,23 @@
+# Generated by Django 5.2.1 on 2026-10-17 10:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0012_recipe_popularity"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="density",
+            field=models.FloatField(blank=True, null=True, verbose_name="密度 (g/ml)"),
+        ),
+        migrations.AddField(
+            model_name="ingredient",
+            name="piece_weight",
+            field=models.FloatField(blank=True, null=True, verbose_name="单个重量 (g)"),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.1 on 2026-10-17 11:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipes", "0013_ingredient_unit_profile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DataVersion",
+            fields=[
+                ("name", models.CharField(max_length=50, primary_key=True, serialize=False, verbose_name="名称")),
+                ("version", models.BigIntegerField(verbose_name="版本号")),
+            ],
+            options={
+                "verbose_name": "数据版本号",
+                "verbose_name_plural": "数据版本号",
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 # recipes/models.py
 from django.db import models
 from django.conf import settings # 用于引用 AUTH_USER_MODEL
+from .fields import id_list_field, id_list_indexes, trigram_indexes
 
 class Ingredient(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name="食材名称")
@@ -31,6 +32,9 @@ class Ingredient(models.Model):
     )
     description = models.TextField(blank=True, null=True, verbose_name="描述")
     image_url = models.URLField(blank=True, null=True, verbose_name="图片链接")
+    # 单位换算 (recipes/units.py) 用：填写后体积 / 个数可换算为克，与按重量记录的用量合并
+    density = models.FloatField(blank=True, null=True, verbose_name="密度 (g/ml)")
+    piece_weight = models.FloatField(blank=True, null=True, verbose_name="单个重量 (g)")
     common_substitutes = models.ManyToManyField(
         'self',
         blank=True,
@@ -121,13 +125,64 @@ class Recipe(models.Model):
     )
     cuisine_type = models.CharField(max_length=100, blank=True, null=True, verbose_name="菜系")
 
+    # 冗余字段：由 RecipeIngredient 推导，避免每次匹配/筛选都去 JOIN 关联表
+    ingredient_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="食材数量")
+    ingredient_ids = id_list_field(default=list, blank=True, editable=False, verbose_name="食材ID列表")
+    # 冗余字段：评分汇总，由 ratings.py 随评价的增删改增量维护
+    rating_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="评价数")
+    rating_sum = models.PositiveIntegerField(default=0, editable=False, verbose_name="评分总和")
+    rating_average = models.FloatField(default=0.0, editable=False, verbose_name="平均评分")
+    rating_1 = models.PositiveIntegerField(default=0, editable=False, verbose_name="1星评价数")
+    rating_2 = models.PositiveIntegerField(default=0, editable=False, verbose_name="2星评价数")
+    rating_3 = models.PositiveIntegerField(default=0, editable=False, verbose_name="3星评价数")
+    rating_4 = models.PositiveIntegerField(default=0, editable=False, verbose_name="4星评价数")
+    rating_5 = models.PositiveIntegerField(default=0, editable=False, verbose_name="5星评价数")
+    # 冗余字段：收藏数与热度，由 popularity.py 随收藏、评价增量维护
+    favorite_count = models.PositiveIntegerField(default=0, editable=False, verbose_name="收藏数")
+    trending_score = models.FloatField(default=0.0, editable=False, verbose_name="热度")
+    # 冗余字段：标题、简介、步骤、食材名、标签名拼接后的小写文本，由 search.py 维护
+    search_document = models.TextField(default='', blank=True, editable=False, verbose_name="搜索文本")
+
     def __str__(self):
         return self.title
 
+    def set_ingredient_summary(self, ingredient_ids):
+        """根据食材 ID 设置冗余字段 (不保存)。"""
+        ids = sorted(set(ingredient_ids))
+        self.ingredient_ids = ids
+        self.ingredient_count = len(ids)
+
+    @classmethod
+    def sync_ingredient_summaries(cls, recipe_ids):
+        """
+        从 RecipeIngredient 重新计算这些菜谱的冗余字段，只写回有变化的菜谱 (不触发 save 信号，也不更新 updated_at)。
+        由 signals.py 在食材变化的事务提交后调用。返回写回的菜谱数量。
+        """
+        ingredient_ids = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list('recipe_id', 'ingredient_id'):
+            ingredient_ids.setdefault(recipe_id, []).append(ingredient_id)
+        changed = []
+        for recipe in cls.objects.filter(pk__in=recipe_ids).only('id', 'ingredient_ids', 'ingredient_count'):
+            current = (list(recipe.ingredient_ids), recipe.ingredient_count)
+            recipe.set_ingredient_summary(ingredient_ids.get(recipe.pk, ()))
+            if (recipe.ingredient_ids, recipe.ingredient_count) != current:
+                changed.append(recipe)
+        cls.objects.bulk_update(changed, ['ingredient_ids', 'ingredient_count'])
+        return len(changed)
+
     class Meta:
         verbose_name = "菜谱"
         verbose_name_plural = "菜谱"
         ordering = ['-updated_at', 'title']
+        indexes = [
+            # 键集分页的排序键 (-updated_at, -id)
+            models.Index(fields=['-updated_at', '-id'], name='recipe_updated_id_idx'),
+            # 按平均评分排序 / 筛选
+            models.Index(fields=['-rating_average', '-rating_count'], name='recipe_rating_average_idx'),
+            # ordering=popular / ordering=trending
+            models.Index(fields=['-favorite_count', '-id'], name='recipe_favorite_count_idx'),
+            models.Index(fields=['-trending_score', '-id'], name='recipe_trending_score_idx'),
+        ] + id_list_indexes('ingredient_ids', 'recipe_ingredient_ids_gin') + trigram_indexes('search_document', 'recipe_search_document_trgm')
 
 
 class RecipeIngredient(models.Model):
@@ -201,11 +256,27 @@ class Review(models.Model):
     def __str__(self):
         return f"Review for {self.recipe.title} by {self.user.username} ({self.rating} stars)"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # 记录从数据库读出时的评分，保存时据此增量更新菜谱的评分汇总 (见 signals.py)。
+        # 延迟加载 (only / defer) 时不能在这里访问缺少的字段：那会再次查询并递归进入 from_db
+        if 'rating' in field_names and 'recipe_id' in field_names:
+            instance.remember_rating()
+        return instance
+
+    def remember_rating(self):
+        self._saved_rating = (self.recipe_id, self.rating)
+
     class Meta:
         verbose_name = "菜谱评价"
         verbose_name_plural = "菜谱评价"
         unique_together = ('recipe', 'user')
         ordering = ['-created_at']
+        indexes = [
+            # 按菜谱分页列出评价 (-created_at, -id)
+            models.Index(fields=['recipe', '-created_at', '-id'], name='review_recipe_created_id_idx'),
+        ]
         
         
 class RecipeStep(models.Model):
@@ -231,4 +302,16 @@ class RecipeStep(models.Model):
         unique_together = ('recipe', 'step_number') # 同一菜谱的步骤序号不能重复
 
     def __str__(self):
-        return f"{self.recipe.title} - 步骤 {self.step_number}"
\ No newline at end of file
+        return f"{self.recipe.title} - 步骤 {self.step_number}"
+
+class DataVersion(models.Model):
+    """数据版本号 (见 versions.py)。保存在数据库中，所有 worker 进程读到的都是同一个值。"""
+    name = models.CharField(max_length=50, primary_key=True, verbose_name="名称")
+    version = models.BigIntegerField(verbose_name="版本号")
+
+    class Meta:
+        verbose_name = "数据版本号"
+        verbose_name_plural = "数据版本号"
+
+    def __str__(self):
+        return f"{self.name}: {self.version}"
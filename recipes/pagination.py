@@ -0,0 +1,160 @@
+# recipes/pagination.py
+"""
+键集 (keyset) 分页。
+
+默认的 PageNumberPagination 每页都要对整个查询集做一次 COUNT(*)，再用 OFFSET 跳过前面的行，
+越往后翻越慢。键集分页按固定的唯一排序键翻页，游标记录上一页最后一条的键值，
+下一页只需 `WHERE 键 < 游标` 加 LIMIT，翻到多深代价都与第一页相同；不返回总数。
+游标只支持向后翻页 (next)，适合移动端的无限滚动。
+游标来自客户端，其中的每个值都按对应字段的类型解析和校验 (datetime 须带时区)，不合法时返回 404。
+"""
+
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    按 ordering 中的字段做键集分页。ordering 必须是非空字段，且最后一个字段唯一 (通常是 id)，
+    客户端传入的 ?ordering= 在此模式下不生效。
+    """
+    cursor_query_param = 'cursor'
+    page_size = api_settings.PAGE_SIZE
+    ordering = ('-updated_at', '-id')
+    invalid_cursor_message = '无效的游标。'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        fields = [queryset.model._meta.get_field(order.lstrip('-')) for order in self.ordering]
+        position = self.decode_cursor(request, fields)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(position))
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        self.next_position = self.get_position(self.page[-1]) if len(results) > self.page_size else None
+        return self.page
+
+    def _after(self, position):
+        """构造“排在 position 之后”的条件：(a < pa) OR (a = pa AND b < pb) OR ..."""
+        condition = Q()
+        equal_prefix = {}
+        for order, value in zip(self.ordering, position):
+            field = order.lstrip('-')
+            lookup = 'lt' if order.startswith('-') else 'gt'
+            condition |= Q(**equal_prefix, **{f'{field}__{lookup}': value})
+            equal_prefix[field] = value
+        return condition
+
+    def get_position(self, instance):
+        position = []
+        for order in self.ordering:
+            value = getattr(instance, order.lstrip('-'))
+            position.append(value.isoformat() if isinstance(value, datetime) else value)
+        return position
+
+    def decode_cursor(self, request, fields):
+        """解析游标，fields 为与 ordering 一一对应的模型字段，游标中的值按字段类型转换。"""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            position = json.loads(urlsafe_b64decode(encoded.encode('ascii')))
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return [self._parse_value(field, value) for field, value in zip(fields, position)]
+
+    def _parse_value(self, field, value):
+        if value is None or isinstance(value, (dict, list)):
+            raise NotFound(self.invalid_cursor_message)
+        try:
+            value = field.to_python(value)
+            # 数值范围等校验 (例如超出数据库整数范围的 ID)
+            field.run_validators(value)
+        except (TypeError, ValueError, OverflowError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            raise NotFound(self.invalid_cursor_message)
+        return value
+
+    def encode_cursor(self, position):
+        encoded = urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        return self.encode_cursor(self.next_position)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+
+class RecipeKeysetPagination(KeysetPagination):
+    ordering = ('-updated_at', '-id')
+
+
+class ReviewKeysetPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+
+
+class MatchKeysetPagination(KeysetPagination):
+    """
+    匹配结果 (matching.MatchResults) 的键集分页，排序键为 (匹配度, 更新时间, ID) 倒序。
+    匹配结果在内存中，游标之后的 top-K 直接由 MatchResults.top_after 选出。
+    """
+    ordering = ('-match_score', '-updated_at', '-id')
+    position_fields = (models.FloatField(), models.DateTimeField(), models.BigIntegerField())
+
+    def paginate_queryset(self, results, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_cursor(request, self.position_fields)
+        if position is not None:
+            position = tuple(position)
+        keyed = results.top_after(position, self.page_size + 1)
+        self.page = [match for match, _ in keyed[:self.page_size]]
+        if len(keyed) > self.page_size:
+            score, updated_at, recipe_id = keyed[self.page_size - 1][1]
+            self.next_position = [score, updated_at.isoformat(), recipe_id]
+        else:
+            self.next_position = None
+        return self.page
+
+
+class KeysetPaginationMixin:
+    """
+    视图集混入：请求带 ?pagination=cursor (或已带 cursor 游标) 时改用 keyset_pagination_class，
+    否则仍使用默认的页码分页。
+    """
+    keyset_pagination_class = None
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+        return self.keyset_pagination_class is not None and (
+            params.get('pagination') == 'cursor' or KeysetPagination.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            pagination_class = self.pagination_class
+            if self.use_keyset_pagination():
+                pagination_class = self.keyset_pagination_class
+            self._paginator = pagination_class() if pagination_class is not None else None
+        return self._paginator
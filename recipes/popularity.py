@@ -0,0 +1,59 @@
+# recipes/popularity.py
+"""
+菜谱的人气与热度计数：Recipe.favorite_count / trending_score。
+
+对收藏关系做 Count('favorited_by') 每次都是一次全表聚合，这里改为随写入增量维护：
+    - favorite_count: 当前收藏数 (收藏 +1，取消收藏 -1)；
+    - trending_score: 带时间衰减的热度。互动 (收藏、评价) 发生时立即加上对应权重，
+      定时任务 (`python manage.py fold_trending_scores`) 每个窗口结束时把热度乘以 TRENDING_DECAY，
+      越早的互动贡献越小。
+计数由 signals.py 在收藏关系变化、评价新增时调用，均为带 F() 表达式的单条 UPDATE。
+"""
+
+from django.conf import settings
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Greatest
+
+from .models import Recipe
+
+FAVORITE_WEIGHT = 1.0
+REVIEW_WEIGHT = 2.0
+# 热度衰减到此值以下时直接归零，避免对长尾菜谱无休止地做乘法
+TRENDING_MIN_SCORE = 0.01
+
+
+def _interaction_updates(weight, times=1):
+    return {'trending_score': F('trending_score') + weight * times}
+
+
+def record_favorites_added(recipe_ids, times=1):
+    """recipe_ids 中的每个菜谱新增 times 次收藏。"""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        favorite_count=F('favorite_count') + times,
+        **_interaction_updates(FAVORITE_WEIGHT, times),
+    )
+
+
+def record_favorites_removed(recipe_ids, times=1):
+    """recipe_ids 中的每个菜谱减少 times 次收藏 (热度不回退)。"""
+    Recipe.objects.filter(pk__in=recipe_ids).update(
+        favorite_count=Greatest(F('favorite_count') - times, Value(0)),
+    )
+
+
+def record_review_added(recipe_id):
+    Recipe.objects.filter(pk=recipe_id).update(**_interaction_updates(REVIEW_WEIGHT))
+
+
+def fold_trending_windows(decay=None):
+    """结束当前时间窗口：热度按 decay 衰减。返回更新的菜谱数量。"""
+    if decay is None:
+        decay = settings.TRENDING_DECAY
+    if decay > 0:
+        decayed = Case(
+            When(trending_score__lt=TRENDING_MIN_SCORE / decay, then=Value(0.0)),
+            default=F('trending_score') * decay,
+        )
+    else:
+        decayed = Value(0.0)
+    return Recipe.objects.filter(trending_score__gt=0).update(trending_score=decayed)
@@ -0,0 +1,92 @@
+# recipes/ratings.py
+"""
+菜谱评分的冗余汇总：Recipe.rating_count / rating_sum / rating_average 以及 1~5 星的计数。
+
+评价新增、修改、删除时由 signals.py 调用 apply_rating_change，用一条带 F() 表达式的 UPDATE
+原子地增减计数 (并发写入不会互相覆盖)，rating_average 在同一条语句中按更新后的值重新计算。
+汇总若因批量写入 (bulk_create / update()) 等原因与评价表不一致，
+可用 `python manage.py reconcile_recipe_ratings` 整体重算。
+"""
+
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import Recipe, Review
+
+RATING_VALUES = (1, 2, 3, 4, 5)
+
+
+def rating_histogram_field(rating):
+    return f'rating_{rating}'
+
+
+RATING_FIELDS = ['rating_count', 'rating_sum', 'rating_average'] + [rating_histogram_field(rating) for rating in RATING_VALUES]
+EMPTY_AGGREGATE = dict.fromkeys(RATING_FIELDS, 0)
+EMPTY_AGGREGATE['rating_average'] = 0.0
+
+
+def apply_rating_change(recipe_id, old_rating=None, new_rating=None):
+    """评价从 old_rating 变为 new_rating (新增时 old 为 None，删除时 new 为 None)，增量更新菜谱的评分汇总。"""
+    if old_rating == new_rating:
+        return
+    count_delta = (new_rating is not None) - (old_rating is not None)
+    sum_delta = (new_rating or 0) - (old_rating or 0)
+    histogram_deltas = {}
+    if old_rating in RATING_VALUES:
+        histogram_deltas[old_rating] = histogram_deltas.get(old_rating, 0) - 1
+    if new_rating in RATING_VALUES:
+        histogram_deltas[new_rating] = histogram_deltas.get(new_rating, 0) + 1
+
+    # UPDATE 中右侧表达式读到的都是更新前的值，因此平均分直接用“旧值 + 增量”计算
+    updates = {
+        'rating_count': F('rating_count') + count_delta,
+        'rating_sum': F('rating_sum') + sum_delta,
+        'rating_average': Coalesce(
+            Cast(F('rating_sum') + sum_delta, FloatField()) / NullIf(F('rating_count') + count_delta, 0),
+            Value(0.0),
+        ),
+    }
+    for rating, delta in histogram_deltas.items():
+        field = rating_histogram_field(rating)
+        updates[field] = F(field) + delta
+    Recipe.objects.filter(pk=recipe_id).update(**updates)
+
+
+def compute_rating_aggregates(recipe_ids=None):
+    """从评价表重新统计评分汇总，返回 {recipe_id: {字段: 值}}；没有评价的菜谱不在其中。"""
+    reviews = Review.objects.all()
+    if recipe_ids is not None:
+        reviews = reviews.filter(recipe_id__in=recipe_ids)
+    rows = reviews.values('recipe_id').order_by().annotate(
+        rating_count=Count('id'),
+        rating_sum=Sum('rating'),
+        **{rating_histogram_field(rating): Count('id', filter=Q(rating=rating)) for rating in RATING_VALUES},
+    )
+    aggregates = {}
+    for row in rows:
+        recipe_id = row.pop('recipe_id')
+        row['rating_average'] = row['rating_sum'] / row['rating_count']
+        aggregates[recipe_id] = row
+    return aggregates
+
+
+def reconcile_recipe_ratings(recipe_ids=None, batch_size=500):
+    """按评价表重算评分汇总并写回有差异的菜谱，返回修正的菜谱数量。"""
+    aggregates = compute_rating_aggregates(recipe_ids)
+    recipes = Recipe.objects.only('id', *RATING_FIELDS)
+    if recipe_ids is not None:
+        recipes = recipes.filter(pk__in=recipe_ids)
+    changed = []
+    for recipe in recipes.iterator():
+        expected = aggregates.get(recipe.pk, EMPTY_AGGREGATE)
+        if any(_differs(getattr(recipe, field), expected[field]) for field in RATING_FIELDS):
+            for field in RATING_FIELDS:
+                setattr(recipe, field, expected[field])
+            changed.append(recipe)
+    Recipe.objects.bulk_update(changed, RATING_FIELDS, batch_size=batch_size)
+    return len(changed)
+
+
+def _differs(current, expected):
+    # 平均分由数据库与 Python 分别计算，允许浮点误差
+    return abs(current - expected) > 1e-9
@@ -0,0 +1,87 @@
+# recipes/response_cache.py
+"""
+菜谱列表 / 详情的响应缓存 (仅匿名用户)。
+
+匿名用户看到的内容只取决于请求参数，热门查询 (已发布菜谱首页、按菜系筛选等) 完全可以复用。
+缓存键 = 动作 + 主键 + 规范化后的查询参数 + 版本：
+    - 列表用菜谱目录版本号 (versions.RECIPE_CATALOGUE)，菜谱、步骤、标签等变化时由 signals.py 递增，旧缓存自然失效；
+    - 详情用视图给出的 response_cache_version (即该菜谱自身状态生成的 ETag)，其他菜谱的写入不影响它。
+基于 Django 缓存框架，locmem / 文件 / Redis 等后端均可使用。
+
+冷键在高并发下只允许一个请求重新计算 (single-flight)：用 cache.add 抢占计算锁，
+其他请求短暂轮询等待结果，超时后各自计算但不写缓存。
+"""
+
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versions import RECIPE_CATALOGUE, get_version
+
+LOCK_TIMEOUT = 10
+WAIT_TIMEOUT = 2.0
+POLL_INTERVAL = 0.05
+
+
+def _response_key(request, view):
+    params = sorted((key, tuple(values)) for key, values in request.query_params.lists())
+    digest = hashlib.sha1(repr((request.get_host(), params)).encode('utf-8')).hexdigest()
+    version = getattr(view, 'response_cache_version', None)
+    if version is None:
+        version = get_version(RECIPE_CATALOGUE)
+    return f"recipes:response:{version}:{view.action}:{view.kwargs.get('pk', '')}:{digest}"
+
+
+def _is_cacheable(request):
+    return (
+        settings.RECIPE_RESPONSE_CACHE_TIMEOUT > 0
+        and request.method == 'GET'
+        and not request.user.is_authenticated
+        and request.accepted_renderer.format == 'json'
+    )
+
+
+def _wait_for(key):
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    return None
+
+
+def cache_anonymous_response(method):
+    """
+    视图方法装饰器：匿名用户的 GET 请求按缓存键复用 200 响应的数据。
+    只缓存 response.data，渲染、内容协商等仍走 DRF 正常流程。
+    """
+    @wraps(method)
+    def wrapper(view, request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return method(view, request, *args, **kwargs)
+
+        key = _response_key(request, view)
+        cached = cache.get(key)
+        if cached is None:
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+                cached = _wait_for(key)
+                if cached is None:
+                    return method(view, request, *args, **kwargs)
+            else:
+                try:
+                    response = method(view, request, *args, **kwargs)
+                    if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                        cache.set(key, response.data, settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+                    return response
+                finally:
+                    cache.delete(lock_key)
+        return Response(cached)
+
+    return wrapper
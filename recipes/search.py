@@ -0,0 +1,235 @@
+# recipes/search.py
+"""
+菜谱全文搜索。
+
+原先的 SearchFilter 对标题、简介、食材名、标签名逐个做 icontains，中文文本用不上 B-tree 索引，
+每次搜索都要扫描整个菜谱表及关联表。这里改为：
+    - 每个菜谱维护一列 search_document (标题、简介、步骤、食材名、标签名拼接后转小写)；
+    - PostgreSQL 上该列建 pg_trgm 的 GIN 索引，搜索走 LIKE + 三元组索引，按相似度排序；
+    - 其他数据库 (SQLite) 在进程内维护字符二元组 (bigram) 倒排索引，按 BM25 打分。
+pg_trgm 的限制：三元组按“单词”(连续的字母数字字符) 提取，少于 3 个字符的词提取不出三元组，
+LIKE '%番茄%' 用不上索引，退化为全表扫描；而 1~2 个汉字的食材名恰恰是最常见的搜索词。
+因此在 PostgreSQL 上，所有片段都短于 TRIGRAM_LENGTH 的查询词 (needs_bigram_index) 改由进程内 bigram 索引
+给出候选菜谱，数据库只对候选做精确的子串过滤。此外，数据库的 LC_CTYPE 须把汉字视为字母 (例如 zh_CN.UTF-8、
+en_US.UTF-8)，在 C locale 下汉字被当作分隔符，中文文本提取不出任何三元组。
+search_document 及进程内索引由 signals.py 在相关数据变化、事务提交后批量刷新，
+其他进程的修改通过版本号发现 (见 indexes.py)。
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .indexes import VersionedIndex
+from .models import Recipe, RecipeIngredient, RecipeStep
+from .versions import SEARCH_INDEX
+
+USE_TRIGRAM_SEARCH = connection.vendor == 'postgresql'
+
+# BM25 参数
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# pg_trgm 的三元组长度：短于此长度的词用不上三元组索引
+TRIGRAM_LENGTH = 3
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def build_search_document(title, description, steps, ingredient_names, tag_names):
+    """拼接菜谱的可搜索文本 (统一转小写，查询时同样转小写后做子串匹配)。"""
+    parts = [title or '', description or '', *steps, *ingredient_names, *tag_names]
+    return '\n'.join(part for part in parts if part).lower()
+
+
+def tokenize(text):
+    """把文本切成检索词：每个连续的字符片段贡献其全部单字与相邻二字组合。"""
+    tokens = []
+    for run in _WORD_RE.findall(text.lower()):
+        tokens.extend(run)
+        tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def query_tokens(term):
+    """查询词对应的检索词：单字查单字，多字查其全部二字组合 (全部命中才算匹配)。"""
+    tokens = set()
+    for run in _WORD_RE.findall(term.lower()):
+        if len(run) == 1:
+            tokens.add(run)
+        else:
+            tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def needs_bigram_index(term):
+    """查询词的每个片段都短于 TRIGRAM_LENGTH 时，pg_trgm 无法用索引匹配它 (见模块说明)。"""
+    runs = _WORD_RE.findall(term.lower())
+    return bool(runs) and all(len(run) < TRIGRAM_LENGTH for run in runs)
+
+
+def compose_search_documents(recipe_ids):
+    """批量生成菜谱的 search_document，共 4 次查询。返回 {recipe_id: document}，已删除的菜谱不在其中。"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return {}
+    steps, ingredient_names, tag_names = {}, {}, {}
+    for recipe_id, description in RecipeStep.objects.filter(recipe_id__in=recipe_ids).order_by('step_number').values_list('recipe_id', 'description'):
+        steps.setdefault(recipe_id, []).append(description)
+    for recipe_id, name in RecipeIngredient.objects.filter(recipe_id__in=recipe_ids).values_list('recipe_id', 'ingredient__name'):
+        ingredient_names.setdefault(recipe_id, []).append(name)
+    tags = Recipe.dietary_tags.through.objects.filter(recipe_id__in=recipe_ids)
+    for recipe_id, name in tags.values_list('recipe_id', 'dietarypreferencetag__name'):
+        tag_names.setdefault(recipe_id, []).append(name)
+    return {
+        recipe_id: build_search_document(
+            title, description, steps.get(recipe_id, ()), ingredient_names.get(recipe_id, ()), tag_names.get(recipe_id, ())
+        )
+        for recipe_id, title, description in Recipe.objects.filter(pk__in=recipe_ids).values_list('id', 'title', 'description')
+    }
+
+
+class RecipeSearchIndex(VersionedIndex):
+    """进程内的 bigram 倒排索引：term -> {recipe_id: 词频}，附带文档长度用于 BM25。增量刷新以菜谱 ID 为单位。"""
+
+    version_name = SEARCH_INDEX
+
+    def __init__(self):
+        super().__init__()
+        self._postings = {}
+        self._doc_terms = {}    # recipe_id -> Counter(term)，增量更新时用于撤销旧文档
+        self._doc_lengths = {}
+        self._total_length = 0
+
+    def _build(self):
+        postings, doc_terms, doc_lengths = {}, {}, {}
+        for recipe_id, document in Recipe.objects.values_list('id', 'search_document').iterator():
+            terms = Counter(tokenize(document))
+            doc_terms[recipe_id] = terms
+            doc_lengths[recipe_id] = sum(terms.values())
+            for term, frequency in terms.items():
+                postings.setdefault(term, {})[recipe_id] = frequency
+        self._postings = postings
+        self._doc_terms = doc_terms
+        self._doc_lengths = doc_lengths
+        self._total_length = sum(doc_lengths.values())
+
+    def _reset(self):
+        self._postings = {}
+        self._doc_terms = {}
+        self._doc_lengths = {}
+        self._total_length = 0
+
+    # ---- 增量刷新 (倒排表写时复制，读线程无需加锁) ----
+
+    def _refresh(self, recipe_ids):
+        """从数据库重新读取这些菜谱的 search_document (已删除的菜谱从索引中移除)。"""
+        documents = dict(Recipe.objects.filter(pk__in=recipe_ids).values_list('id', 'search_document'))
+        for recipe_id in recipe_ids:
+            self._remove(recipe_id)
+            if recipe_id in documents:
+                self._add(recipe_id, documents[recipe_id])
+
+    def _add(self, recipe_id, document):
+        terms = Counter(tokenize(document))
+        for term, frequency in terms.items():
+            self._postings[term] = {**self._postings.get(term, {}), recipe_id: frequency}
+        self._doc_terms[recipe_id] = terms
+        self._doc_lengths[recipe_id] = sum(terms.values())
+        self._total_length += self._doc_lengths[recipe_id]
+
+    def _remove(self, recipe_id):
+        terms = self._doc_terms.pop(recipe_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            remaining = {key: value for key, value in self._postings.get(term, {}).items() if key != recipe_id}
+            if remaining:
+                self._postings[term] = remaining
+            else:
+                self._postings.pop(term, None)
+        self._total_length -= self._doc_lengths.pop(recipe_id, 0)
+
+    # ---- 查询 ----
+
+    def search(self, search_terms):
+        """
+        返回 {recipe_id: BM25 得分}。每个查询词的全部检索词都必须出现在文档中 (多个查询词之间为 AND)，
+        与原先逐词 icontains 的语义一致。
+        """
+        self.ensure_built()
+        postings = self._postings
+        doc_lengths = self._doc_lengths
+        doc_count = len(doc_lengths)
+        if not doc_count:
+            return {}
+        average_length = self._total_length / doc_count
+
+        candidates = None
+        all_tokens = set()
+        for term in search_terms:
+            tokens = query_tokens(term)
+            if not tokens:
+                continue
+            for token in sorted(tokens, key=lambda token: len(postings.get(token, ()))):
+                matched = postings.get(token, {}).keys()
+                candidates = set(matched) if candidates is None else candidates & matched
+                if not candidates:
+                    return {}
+            all_tokens |= tokens
+        if candidates is None:
+            return {}
+
+        scores = dict.fromkeys(candidates, 0.0)
+        for token in all_tokens:
+            posting = postings.get(token, {})
+            idf = math.log(1 + (doc_count - len(posting) + 0.5) / (len(posting) + 0.5))
+            for recipe_id in candidates:
+                frequency = posting.get(recipe_id)
+                if frequency:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths[recipe_id] / average_length)
+                    scores[recipe_id] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        return scores
+
+
+recipe_search_index = RecipeSearchIndex()
+
+
+def refresh_search_documents(recipe_ids):
+    """
+    重新生成菜谱的 search_document 并写回数据库 (不触发 save 信号，也不更新 updated_at)，
+    事务提交后刷新进程内索引 (已删除的菜谱从索引中移除)。
+    """
+    recipe_ids = set(recipe_ids)
+    documents = compose_search_documents(recipe_ids)
+    Recipe.objects.bulk_update(
+        [Recipe(pk=recipe_id, search_document=document) for recipe_id, document in documents.items()],
+        ['search_document'], batch_size=500
+    )
+    recipe_search_index.schedule_refresh(recipe_ids)
+
+
+_pending = threading.local()
+
+
+def schedule_search_refresh(recipe_ids):
+    """
+    在当前事务提交后刷新这些菜谱的 search_document。同一事务内的多次调用合并为一次批量刷新
+    (例如后台内联保存多条食材、步骤时)。
+    """
+    pending = getattr(_pending, 'recipe_ids', None)
+    if pending is None:
+        pending = _pending.recipe_ids = set()
+    pending.update(recipe_ids)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    recipe_ids = getattr(_pending, 'recipe_ids', None)
+    if not recipe_ids:
+        return
+    _pending.recipe_ids = set()
+    refresh_search_documents(recipe_ids)
@@ -0,0 +1,92 @@
+# recipes/shopping.py
+"""
+把一个或多个菜谱所需的食材合并进用户的购物清单。
+
+一周的菜单往往包含几十个菜谱，逐个菜谱处理既要反复查询，又无法把同一食材的用量合并。
+这里一次性读出所有菜谱的 RecipeIngredient，经 units.py 换算到基准单位后按 (食材, 基准单位) 汇总用量
+(乘以各菜谱的份量倍数)，跳过库存中已有的食材，再与清单中尚未购买的同食材条目合并：
+已有条目增加数量 (bulk_update)，其余新建 (bulk_create)。查询次数与菜谱数量无关。
+清单中的数量以便于阅读的单位保存 (例如 1500 g 保存为 1.5 kg)。
+"""
+
+from django.db import transaction
+
+from users.inventory import get_inventory_vector
+from users.models import ShoppingListItem
+
+from .models import RecipeIngredient
+from .units import convert_many, for_display, load_unit_profiles, to_base
+
+
+def aggregate_requirements(recipe_multipliers):
+    """
+    recipe_multipliers: {recipe_id: 份量倍数}。
+    返回 ({(ingredient_id, 基准单位): (总用量, 涉及的菜谱 ID 集合)}, 食材的换算参数 load_unit_profiles)。
+    """
+    rows = list(RecipeIngredient.objects.filter(recipe_id__in=recipe_multipliers).values_list(
+        'recipe_id', 'ingredient_id', 'unit', 'quantity'
+    ))
+    if not rows:
+        return {}, {}
+    recipe_ids, ingredient_ids, units, quantities = zip(*rows)
+    profiles = load_unit_profiles(set(ingredient_ids))
+    base_quantities, base_units = convert_many(quantities, units, ingredient_ids, profiles)
+
+    totals = {}
+    for recipe_id, ingredient_id, base_unit, quantity in zip(recipe_ids, ingredient_ids, base_units, base_quantities):
+        total, contributing = totals.get((ingredient_id, base_unit), (0.0, set()))
+        contributing.add(recipe_id)
+        totals[(ingredient_id, base_unit)] = (total + quantity * recipe_multipliers[recipe_id], contributing)
+    return totals, profiles
+
+
+def _stored_quantity(quantity, base_unit):
+    quantity, unit = for_display(quantity, base_unit)
+    return round(quantity, 3), unit
+
+
+@transaction.atomic
+def add_recipes_to_shopping_list(user, recipe_multipliers):
+    """
+    把菜谱缺少的食材合并进 user 的购物清单，返回 (新建条目数, 增加数量的条目数)。
+    库存只记录有无、不记录数量，因此库存中已有的食材视为不缺。
+    """
+    owned = set(get_inventory_vector(user))
+    requirements, profiles = aggregate_requirements(recipe_multipliers)
+    needed = {key: requirement for key, requirement in requirements.items() if key[0] not in owned}
+    if not needed:
+        return 0, 0
+
+    # 已有条目也换算到基准单位比较；同一食材同一基准单位若有多条未购买的条目，合并到最早的一条
+    existing = {}
+    pending_items = ShoppingListItem.objects.select_for_update().filter(
+        user=user,
+        is_purchased=False,
+        ingredient_id__in={ingredient_id for ingredient_id, _ in needed},
+    ).order_by('id')
+    for item in pending_items:
+        quantity, base_unit = to_base(item.quantity or 0, item.unit, *profiles.get(item.ingredient_id, ()))
+        existing.setdefault((item.ingredient_id, base_unit), (item, quantity))
+
+    to_update = []
+    to_create = []
+    for (ingredient_id, base_unit), (quantity, recipe_ids) in needed.items():
+        if (ingredient_id, base_unit) in existing:
+            item, existing_quantity = existing[(ingredient_id, base_unit)]
+            item.quantity, item.unit = _stored_quantity(existing_quantity + quantity, base_unit)
+            to_update.append(item)
+        else:
+            quantity, unit = _stored_quantity(quantity, base_unit)
+            to_create.append(ShoppingListItem(
+                user=user,
+                ingredient_id=ingredient_id,
+                quantity=quantity,
+                unit=unit,
+                # 多个菜谱共同需要的食材不关联到单个菜谱
+                related_recipe_id=next(iter(recipe_ids)) if len(recipe_ids) == 1 else None,
+            ))
+    if to_update:
+        ShoppingListItem.objects.bulk_update(to_update, ['quantity', 'unit'])
+    if to_create:
+        ShoppingListItem.objects.bulk_create(to_create)
+    return len(to_create), len(to_update)
@@ -0,0 +1,350 @@
+# recipes/signals.py
+"""
+模型信号：保持进程内的匹配索引、替代关系图、搜索文本、补全索引与数据库同步，并在数据变化时递增版本号。
+进程内索引只登记需要刷新的条目，事务提交后才从数据库重新读取 (见 indexes.py)。
+注意：bulk_create / update() 不会触发信号，这类写入需要调用方自行刷新索引。
+"""
+
+import threading
+
+from django.db import transaction
+from django.utils import timezone
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from users.models import User
+
+from .autocomplete import INGREDIENT, RECIPE, autocomplete_index
+from .eligibility import invalidate_user_eligibility
+from .matching import recipe_match_index
+from .models import DietaryPreferenceTag, Ingredient, Recipe, RecipeIngredient, RecipeStep, Review
+from .popularity import record_favorites_added, record_favorites_removed, record_review_added
+from .ratings import apply_rating_change, reconcile_recipe_ratings
+from .search import recipe_search_index, schedule_search_refresh
+from .substitutes import substitute_graph
+from .versions import DIETARY_TAGS, INGREDIENT_CATALOGUE, RECIPE_CATALOGUE, RECIPE_TAGS, schedule_bump
+
+
+# 菜谱的 update 路径用 bulk_update / bulk_create 写食材，由 Recipe.save 的信号负责刷新
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def refresh_recipe_match_index(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recipe_match_index.schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def refresh_match_index_on_recipe_ingredient_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    recipe_match_index.schedule_refresh([instance.recipe_id])
+
+
+_pending_recipes = threading.local()
+
+
+def _pending_recipe_ids(name):
+    pending = getattr(_pending_recipes, name, None)
+    if pending is None:
+        pending = set()
+        setattr(_pending_recipes, name, pending)
+    return pending
+
+
+def schedule_ingredient_summary_sync(recipe_ids):
+    """
+    事务提交后同步菜谱的 ingredient_ids / ingredient_count 冗余字段；同一事务内的多次调用合并为一次。
+    这两列是“不吃的食材”、exclude_ingredients 等筛选的唯一依据，任何 RecipeIngredient 的写入都经过这里。
+    """
+    _pending_recipe_ids('summaries').update(recipe_ids)
+    transaction.on_commit(_flush_pending_recipes)
+
+
+def schedule_recipe_touch(recipe_ids):
+    """
+    食材、步骤单独写入 (同一事务中菜谱本身没有保存) 时，提交后更新菜谱的 updated_at。
+    菜谱详情的 ETag 与匿名响应缓存按菜谱自身的 updated_at 区分版本，见 api_views.RecipeViewSet.retrieve。
+    """
+    _pending_recipe_ids('touched').update(recipe_ids)
+    transaction.on_commit(_flush_pending_recipes)
+
+
+def _flush_pending_recipes():
+    summaries = _pending_recipe_ids('summaries')
+    touched = _pending_recipe_ids('touched') - _pending_recipe_ids('saved')
+    _pending_recipes.summaries, _pending_recipes.touched, _pending_recipes.saved = set(), set(), set()
+    changed = Recipe.sync_ingredient_summaries(summaries) if summaries else 0
+    if touched:
+        Recipe.objects.filter(pk__in=touched).update(updated_at=timezone.now())
+    if changed or touched:
+        # 提交与同步之间按旧数据算出的匿名列表缓存随之失效。此时已不在事务中，schedule_bump 立即递增，
+        # 并与本次提交中其他信号登记的递增合并
+        schedule_bump(RECIPE_CATALOGUE)
+
+
+# bulk_create 写入的食材 (菜谱序列化器、seed_recipes) 由随后 Recipe.save 的信号一并同步
+@receiver(post_save, sender=Recipe)
+def sync_ingredient_summary_on_recipe_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    # 菜谱本身已保存 (updated_at 已更新)，同一事务中其食材、步骤的写入无需再更新 updated_at
+    _pending_recipe_ids('saved').add(instance.pk)
+    schedule_ingredient_summary_sync([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def sync_ingredient_summary_on_recipe_ingredient_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_ingredient_summary_sync([instance.recipe_id])
+    schedule_recipe_touch([instance.recipe_id])
+
+
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+def touch_recipe_on_step_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_recipe_touch([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Ingredient.common_substitutes.through)
+def refresh_substitute_graph(sender, instance, action, pk_set, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        substitute_graph.schedule_refresh({instance.pk, *(pk_set or ())})
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def refresh_substitute_graph_on_ingredient_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    substitute_graph.schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_ingredient_catalogue_version(sender, **kwargs):
+    # 事务提交后再递增，避免其他进程在提交前按新版本号渲染出旧数据
+    schedule_bump(INGREDIENT_CATALOGUE)
+
+
+@receiver(m2m_changed, sender=Ingredient.common_substitutes.through)
+def bump_ingredient_catalogue_version_on_substitutes_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_bump(INGREDIENT_CATALOGUE)
+
+
+# 菜谱目录版本号：匿名用户的列表响应缓存 (response_cache) 以此失效 (详情按菜谱自身的状态缓存)。
+# 同一事务内的多次递增在提交后合并为一次 (versions.schedule_bump)。
+# 评价不递增：列表中的评分汇总最多滞后 RECIPE_RESPONSE_CACHE_TIMEOUT 秒，换来评价不会清空全部列表缓存。
+# 食材只在修改 (可能改名，影响搜索文本) 时递增，新增食材与任何菜谱无关；删除食材时关联行的信号会递增。
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+@receiver(post_save, sender=DietaryPreferenceTag)
+@receiver(post_delete, sender=DietaryPreferenceTag)
+def bump_recipe_catalogue_version(sender, **kwargs):
+    schedule_bump(RECIPE_CATALOGUE)
+
+
+@receiver(post_save, sender=Ingredient)
+def bump_recipe_catalogue_version_on_ingredient_change(sender, created, **kwargs):
+    if not created:
+        schedule_bump(RECIPE_CATALOGUE)
+
+
+@receiver(m2m_changed, sender=Recipe.dietary_tags.through)
+@receiver(m2m_changed, sender=Ingredient.common_substitutes.through)
+def bump_recipe_catalogue_version_on_m2m_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_bump(RECIPE_CATALOGUE)
+
+
+@receiver(m2m_changed, sender=Recipe.dietary_tags.through)
+def bump_recipe_tags_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        schedule_bump(RECIPE_TAGS)
+
+
+@receiver(post_delete, sender=DietaryPreferenceTag)
+def bump_recipe_tags_version_on_tag_delete(sender, **kwargs):
+    schedule_bump(RECIPE_TAGS)
+
+
+@receiver(post_save, sender=DietaryPreferenceTag)
+@receiver(post_delete, sender=DietaryPreferenceTag)
+def bump_dietary_tags_version(sender, **kwargs):
+    schedule_bump(DIETARY_TAGS)
+
+
+def _invalidate_eligibility_on_commit(user_ids):
+    for user_id in user_ids:
+        transaction.on_commit(lambda user_id=user_id: invalidate_user_eligibility(user_id))
+
+
+_PREFERENCE_FIELDS = {
+    User.disliked_ingredients.through: User.disliked_ingredients.field,
+    User.dietary_preferences.through: User.dietary_preferences.field,
+}
+
+
+@receiver(m2m_changed, sender=User.disliked_ingredients.through)
+@receiver(m2m_changed, sender=User.dietary_preferences.through)
+def invalidate_eligibility_on_preferences_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            _invalidate_eligibility_on_commit([instance.pk])
+    elif action == 'pre_clear':
+        # 从食材/标签一侧 clear()，post_clear 时已查不到受影响的用户，在这里查出
+        field = _PREFERENCE_FIELDS[sender]
+        _invalidate_eligibility_on_commit(sender.objects.filter(
+            **{field.m2m_reverse_field_name(): instance.pk}
+        ).values_list(field.m2m_field_name(), flat=True))
+    elif action in ('post_add', 'post_remove'):
+        _invalidate_eligibility_on_commit(pk_set)
+
+
+@receiver(pre_delete, sender=Ingredient)
+@receiver(pre_delete, sender=DietaryPreferenceTag)
+def invalidate_eligibility_on_preference_target_delete(sender, instance, **kwargs):
+    """删除食材/标签时关联行被级联删除 (不触发 m2m_changed)，缓存了它的用户需要失效。"""
+    relation = User.disliked_ingredients if sender is Ingredient else User.dietary_preferences
+    _invalidate_eligibility_on_commit(
+        relation.through.objects.filter(**{relation.field.m2m_reverse_field_name(): instance.pk})
+        .values_list(relation.field.m2m_field_name(), flat=True)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+def refresh_search_document_on_recipe_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_search_refresh([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_recipe_from_search_index(sender, instance, **kwargs):
+    recipe_search_index.schedule_refresh([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+@receiver(post_save, sender=RecipeStep)
+@receiver(post_delete, sender=RecipeStep)
+def refresh_search_document_on_recipe_part_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    schedule_search_refresh([instance.recipe_id])
+
+
+@receiver(m2m_changed, sender=Recipe.dietary_tags.through)
+def refresh_search_document_on_tags_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            schedule_search_refresh([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        schedule_search_refresh(pk_set)
+    elif action == 'pre_clear':
+        # 从标签一侧 clear()，需在清除前记下受影响的菜谱
+        schedule_search_refresh(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_search_document_on_ingredient_rename(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    schedule_search_refresh(RecipeIngredient.objects.filter(ingredient=instance).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=DietaryPreferenceTag)
+def refresh_search_document_on_tag_rename(sender, instance, created, raw=False, **kwargs):
+    if raw or created:
+        return
+    schedule_search_refresh(instance.recipes.values_list('id', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def refresh_autocomplete_on_ingredient_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    autocomplete_index.schedule_refresh([(INGREDIENT, instance.pk)])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def refresh_autocomplete_on_recipe_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    autocomplete_index.schedule_refresh([(RECIPE, instance.pk)])
+
+
+@receiver(post_save, sender=Review)
+def update_rating_aggregates_on_review_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    saved = getattr(instance, '_saved_rating', None)
+    if created:
+        apply_rating_change(instance.recipe_id, new_rating=instance.rating)
+        record_review_added(instance.recipe_id)
+    elif saved is None:
+        # 实例不是从数据库读出的，旧评分未知，只能重算该菜谱
+        reconcile_recipe_ratings([instance.recipe_id])
+    else:
+        old_recipe_id, old_rating = saved
+        if old_recipe_id != instance.recipe_id:
+            apply_rating_change(old_recipe_id, old_rating=old_rating)
+            apply_rating_change(instance.recipe_id, new_rating=instance.rating)
+        else:
+            apply_rating_change(instance.recipe_id, old_rating, instance.rating)
+    instance.remember_rating()
+
+
+@receiver(pre_delete, sender=Review)
+def remember_rating_before_review_delete(sender, instance, **kwargs):
+    # 延迟加载的实例没有记录评分；删除前行还在，此时读出 (删除后再访问延迟字段会查不到)
+    if not hasattr(instance, '_saved_rating'):
+        instance.remember_rating()
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_aggregates_on_review_delete(sender, instance, **kwargs):
+    recipe_id, rating = instance._saved_rating
+    apply_rating_change(recipe_id, old_rating=rating)
+
+
+@receiver(m2m_changed, sender=User.favorite_recipes.through)
+def update_popularity_on_favorites_change(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    收藏关系变化时更新菜谱的收藏数与热度。post_add 的 pk_set 只含新增的关系；
+    remove() 的 pk_set 是调用方传入的全部 ID，需在 pre_remove 时查出实际存在的关系。
+    """
+    through = User.favorite_recipes.through
+    if action == 'pre_remove':
+        existing = through.objects.filter(**{'recipe_id' if reverse else 'user_id': instance.pk})
+        existing = existing.filter(**{'user_id__in' if reverse else 'recipe_id__in': pk_set})
+        instance._removed_favorite_ids = set(existing.values_list('user_id' if reverse else 'recipe_id', flat=True))
+    elif action == 'pre_clear':
+        if reverse:
+            count = through.objects.filter(recipe_id=instance.pk).count()
+            if count:
+                record_favorites_removed([instance.pk], times=count)
+        else:
+            record_favorites_removed(through.objects.filter(user_id=instance.pk).values_list('recipe_id', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        if action == 'post_remove':
+            pk_set = instance.__dict__.pop('_removed_favorite_ids', set())
+        if not pk_set:
+            return
+        record = record_favorites_added if action == 'post_add' else record_favorites_removed
+        if reverse:
+            record([instance.pk], times=len(pk_set))
+        else:
+            record(pk_set)
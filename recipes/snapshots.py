@@ -0,0 +1,45 @@
+# recipes/snapshots.py
+"""
+食材目录的预渲染快照。
+
+食材列表接口不分页、每次启动 App 都会请求，而内容很少变化。
+这里把完整列表渲染成 JSON 字节串 (以及 gzip 压缩版本) 缓存在进程内，
+并以食材目录版本号作为 ETag；版本号在食材或替代关系变化时递增。
+"""
+
+import gzip
+import threading
+
+from rest_framework.renderers import JSONRenderer
+
+from .api_serializers import IngredientSerializer
+from .models import Ingredient
+from .versions import INGREDIENT_CATALOGUE, get_version
+
+
+class IngredientCatalogueSnapshot:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None  # (version, body, gzipped_body)
+
+    def get(self):
+        """返回 (version, body, gzipped_body)，版本号变化时重新渲染。"""
+        version = get_version(INGREDIENT_CATALOGUE)
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot[0] == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is None or snapshot[0] != version:
+                body = self._render()
+                snapshot = (version, body, gzip.compress(body))
+                self._snapshot = snapshot
+        return snapshot
+
+    def _render(self):
+        queryset = Ingredient.objects.prefetch_related('common_substitutes').order_by('name')
+        return JSONRenderer().render(IngredientSerializer(queryset, many=True).data)
+
+
+ingredient_catalogue_snapshot = IngredientCatalogueSnapshot()
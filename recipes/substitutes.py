@@ -0,0 +1,106 @@
+# recipes/substitutes.py
+"""
+食材替代关系 (Ingredient.common_substitutes) 的进程内邻接表。
+
+匹配引擎在 match_mode=substitutes 时需要知道“已有食材还能顶替哪些食材”，
+菜谱详情也要为每种食材列出替代品。为避免每次请求都去查 M2M 关联表，
+这里在首次使用时一次性加载整张替代关系图以及食材的摘要信息，
+之后由 signals.py 中的 m2m_changed / post_save / post_delete 信号在事务提交后增量刷新，
+其他进程的修改通过版本号发现 (见 indexes.py)。
+"""
+
+from .indexes import VersionedIndex
+from .models import Ingredient
+from .versions import SUBSTITUTE_GRAPH
+
+
+class SubstituteGraph(VersionedIndex):
+    """对称的食材替代关系图：ingredient_id -> frozenset(可互相替代的食材 ID)。增量刷新以食材 ID 为单位。"""
+
+    version_name = SUBSTITUTE_GRAPH
+    SUMMARY_FIELDS = ('id', 'name', 'category', 'description')
+
+    def __init__(self):
+        super().__init__()
+        self._neighbors = {}
+        self._summaries = {}  # ingredient_id -> 替代品展示用的摘要 (同 IngredientSubstituteSerializer)
+
+    def _build(self):
+        neighbors = {}
+        through = Ingredient.common_substitutes.through
+        for source_id, target_id in through.objects.values_list('from_ingredient_id', 'to_ingredient_id').iterator():
+            neighbors.setdefault(source_id, set()).add(target_id)
+            neighbors.setdefault(target_id, set()).add(source_id)
+        self._neighbors = {ingredient_id: frozenset(ids) for ingredient_id, ids in neighbors.items()}
+        self._summaries = {
+            summary['id']: summary
+            for summary in Ingredient.objects.values(*self.SUMMARY_FIELDS).iterator()
+        }
+
+    def _reset(self):
+        self._neighbors = {}
+        self._summaries = {}
+
+    def _refresh(self, ingredient_ids):
+        """从数据库重新读取这些食材的摘要与替代关系 (已删除的食材连同其关系一并移除)。"""
+        summaries = {
+            summary['id']: summary
+            for summary in Ingredient.objects.filter(pk__in=ingredient_ids).values(*self.SUMMARY_FIELDS)
+        }
+        current = {ingredient_id: set() for ingredient_id in ingredient_ids}
+        through = Ingredient.common_substitutes.through
+        # 对称关系在关联表中双向各存一行，按 from 一侧查询即可取到这些食材的全部关系
+        rows = through.objects.filter(from_ingredient_id__in=ingredient_ids).values_list('from_ingredient_id', 'to_ingredient_id')
+        for source_id, target_id in rows:
+            if source_id != target_id:
+                current[source_id].add(target_id)
+
+        for ingredient_id, new_neighbors in current.items():
+            old_neighbors = self._neighbors.get(ingredient_id, frozenset())
+            for substitute_id in old_neighbors - new_neighbors:
+                self._unlink(ingredient_id, substitute_id)
+                self._unlink(substitute_id, ingredient_id)
+            for substitute_id in new_neighbors - old_neighbors:
+                self._link(ingredient_id, substitute_id)
+                self._link(substitute_id, ingredient_id)
+            if ingredient_id in summaries:
+                self._summaries[ingredient_id] = summaries[ingredient_id]
+            else:
+                self._summaries.pop(ingredient_id, None)
+
+    # ---- 查询 ----
+
+    def neighbors(self, ingredient_id):
+        self.ensure_built()
+        return self._neighbors.get(ingredient_id, frozenset())
+
+    def substitutes_for(self, ingredient_id):
+        """返回食材的替代品摘要列表 (按名称排序)，不产生数据库查询。"""
+        self.ensure_built()
+        summaries = self._summaries
+        substitutes = [summaries[i] for i in self._neighbors.get(ingredient_id, ()) if i in summaries]
+        return sorted(substitutes, key=lambda summary: summary['name'])
+
+    def covered_by(self, ingredient_ids):
+        """给定已有食材，返回可以通过替代覆盖到的其他食材 ID (不含已有食材本身)。"""
+        self.ensure_built()
+        owned = set(ingredient_ids)
+        covered = set()
+        for ingredient_id in owned:
+            covered.update(self._neighbors.get(ingredient_id, ()))
+        return covered - owned
+
+    # ---- 邻接集合写时复制，读线程无需加锁 ----
+
+    def _link(self, source_id, target_id):
+        self._neighbors[source_id] = self._neighbors.get(source_id, frozenset()) | {target_id}
+
+    def _unlink(self, source_id, target_id):
+        remaining = self._neighbors.get(source_id, frozenset()) - {target_id}
+        if remaining:
+            self._neighbors[source_id] = remaining
+        else:
+            self._neighbors.pop(source_id, None)
+
+
+substitute_graph = SubstituteGraph()
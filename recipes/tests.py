@@ -1,3 +1,816 @@
-from django.test import TestCase
+import io
+import json
+from base64 import urlsafe_b64encode
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from users.models import ShoppingListItem, User, UserInventoryItem
+from .autocomplete import INGREDIENT, autocomplete_index
+from .matching import recipe_match_index
+from .models import DietaryPreferenceTag, Ingredient, Recipe, RecipeIngredient, RecipeStep, Review
+from .search import needs_bigram_index, recipe_search_index
+from .substitutes import substitute_graph
+from .versions import MATCH_INDEX, RECIPE_CATALOGUE, SUBSTITUTE_GRAPH, bump_version, get_version
+
+IN_PROCESS_INDEXES = (recipe_match_index, substitute_graph, recipe_search_index, autocomplete_index)
+
+
+def reset_in_process_indexes():
+    # 进程内索引在测试之间共享，而 TestCase 的事务从不提交 (on_commit 的刷新不会执行)，每个测试从数据库重建
+    for index in IN_PROCESS_INDEXES:
+        index.invalidate()
+
+
+class RecipeListQueryPlanTests(TestCase):
+    """菜谱列表的常见筛选组合不应产生 DISTINCT (跨关联条件均为 EXISTS 子查询)。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        # TestCase 中事务不会提交，这里手动执行 on_commit 回调 (冗余字段同步、搜索文本刷新)
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_user('planner', 'planner@example.com', 'password123')
+            cls.tomato = Ingredient.objects.create(name='番茄')
+            cls.egg = Ingredient.objects.create(name='鸡蛋')
+            cls.tag = DietaryPreferenceTag.objects.create(name='素食')
+            cls.user.disliked_ingredients.add(cls.egg)
+
+            cls.recipe = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+            RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato, quantity=2, unit='piece')
+            cls.recipe.dietary_tags.add(cls.tag)
+
+    def setUp(self):
+        reset_in_process_indexes()
+
+    def assert_no_distinct(self, params, user=None):
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        recipe_queries = [q['sql'] for q in queries.captured_queries if 'recipes_recipe' in q['sql']]
+        self.assertTrue(recipe_queries)
+        for sql in recipe_queries:
+            self.assertNotIn('DISTINCT', sql.upper())
+        return response.json()
+
+    def test_anonymous_list(self):
+        data = self.assert_no_distinct({})
+        self.assertEqual(data['count'], 1)
+
+    def test_search_across_ingredients_and_tags(self):
+        self.assertEqual(self.assert_no_distinct({'search': '番茄'})['count'], 1)
+        self.assertEqual(self.assert_no_distinct({'search': '素食'})['count'], 1)
+        # 搜索索引中没有命中的菜谱时，列表查询直接短路为空结果
+        with CaptureQueriesContext(connection) as queries:
+            response = APIClient().get('/api/recipes/', {'search': '鸡蛋'})
+        self.assertEqual(response.json()['count'], 0)
+        self.assertFalse([q for q in queries.captured_queries if 'recipes_recipe' in q['sql']])
+
+    def test_dietary_tag_filters(self):
+        self.assertEqual(self.assert_no_distinct({'dietary_tags__name': '素食'})['count'], 1)
+        self.assertEqual(self.assert_no_distinct({'dietary_tags__name__in': '素食,无麸质'})['count'], 1)
+        self.assertEqual(self.assert_no_distinct({'dietary_tags__name': '无麸质'})['count'], 0)
+
+    def test_ingredient_exclusions_for_authenticated_user(self):
+        params = {'exclude_ingredients': str(self.tomato.id), 'search': '汤', 'dietary_tags__name': '素食'}
+        self.assertEqual(self.assert_no_distinct(params, user=self.user)['count'], 0)
+        self.assertEqual(self.assert_no_distinct({'search': '汤'}, user=self.user)['count'], 1)
+
+    def test_query_count_does_not_grow_with_page_size(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        def count_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = client.get('/api/recipes/')
+            self.assertEqual(response.status_code, 200)
+            return len(response.json()['results']), len(queries)
+
+        def add_recipes(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipes = [Recipe.objects.create(title=f'番茄汤 {i}', status='published', author=self.user) for i in range(count)]
+                for recipe in recipes:
+                    RecipeIngredient.objects.create(recipe=recipe, ingredient=self.tomato, quantity=1, unit='piece')
+                    recipe.dietary_tags.add(self.tag)
+                self.user.favorite_recipes.add(*recipes[::2])
+
+        count_queries()  # 预热用户相关的缓存
+        add_recipes(1)
+        rows, small = count_queries()
+        self.assertEqual(rows, 2)
+        add_recipes(8)
+        rows, large = count_queries()
+        self.assertEqual(rows, 10)
+        self.assertEqual(small, large)
+
+
+class RecipeMatchParamTests(TestCase):
+    """available_ingredients 等 ID 参数来自客户端，非正整数应被拒绝，极大的 ID 不应影响匹配。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('matcher', 'matcher@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.egg = Ingredient.objects.create(name='鸡蛋')
+        cls.recipe = Recipe.objects.create(title='番茄炒蛋', status='published', author=cls.user)
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato, quantity=2, unit='piece')
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.egg, quantity=3, unit='piece')
+
+    def setUp(self):
+        reset_in_process_indexes()
+
+    def test_non_positive_ids_are_rejected(self):
+        for value in ['-1', '0', f'{self.tomato.pk},-5']:
+            response = APIClient().get('/api/recipes/', {'available_ingredients': value, 'include_missing': 'true'})
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_huge_ids_do_not_affect_missing_ingredients(self):
+        params = {'available_ingredients': f'{self.tomato.pk},{10 ** 12}', 'include_missing': 'true'}
+        response = APIClient().get('/api/recipes/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['missing_ingredients'], [{'id': self.egg.pk, 'name': '鸡蛋'}])
+        self.assertEqual(recipe_match_index.missing_ingredient_ids(self.recipe.pk, {-1, 10 ** 12}), sorted([self.tomato.pk, self.egg.pk]))
+
+    def test_invalid_exclusion_ids_are_ignored(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get('/api/recipes/', {'exclude_ingredients': '-1'})
+        self.assertEqual(response.json()['count'], 1)
+
+
+class RecipeMatchBatchTests(TestCase):
+    """批量匹配：每组食材输出一行 JSON，相同的食材组只打分一次，且不占用匹配结果缓存。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('batcher', 'batcher@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.egg = Ingredient.objects.create(name='鸡蛋')
+        cls.stir_fry = Recipe.objects.create(title='番茄炒蛋', status='published', author=cls.user)
+        cls.soup = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+        RecipeIngredient.objects.create(recipe=cls.stir_fry, ingredient=cls.tomato, quantity=2, unit='piece')
+        RecipeIngredient.objects.create(recipe=cls.stir_fry, ingredient=cls.egg, quantity=3, unit='piece')
+        RecipeIngredient.objects.create(recipe=cls.soup, ingredient=cls.tomato, quantity=2, unit='piece')
+
+    def setUp(self):
+        reset_in_process_indexes()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_ndjson_output_with_duplicate_baskets(self):
+        baskets = [[self.egg.pk], [self.tomato.pk], [self.egg.pk, self.egg.pk], []]
+        with mock.patch.object(recipe_match_index, '_score', wraps=recipe_match_index._score) as score:
+            response = self.client.post('/api/recipes/match-batch/', {'baskets': baskets, 'top_k': 1}, format='json')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['basket'] for row in rows], [0, 1, 2, 3])
+        self.assertEqual([[result['id'] for result in row['results']] for row in rows], [
+            [self.stir_fry.pk], [self.soup.pk], [self.stir_fry.pk], [],
+        ])
+        self.assertEqual(rows[0]['results'][0], {
+            'id': self.stir_fry.pk, 'title': '番茄炒蛋', 'match_score': 0.5,
+            'matched_count': 1, 'substituted_count': 0, 'missing_count': 1,
+        })
+        # 相同的食材组 (忽略重复的食材) 只打分一次
+        self.assertEqual(score.call_count, 3)
+        self.assertEqual(len(recipe_match_index._match_cache), 0)
+
+
+class InProcessIndexSyncTests(TestCase):
+    """进程内索引只应用已提交的写入，并能发现其他进程的写入 (版本号变化)。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('indexer', 'indexer@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.salt = Ingredient.objects.create(name='盐')
+        cls.recipe = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato, quantity=2, unit='piece')
+
+    def setUp(self):
+        reset_in_process_indexes()
+
+    def test_rolled_back_write_is_not_indexed(self):
+        recipe_match_index.ensure_built()
+        substitute_graph.ensure_built()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.salt, quantity=1, unit='g')
+                    self.tomato.common_substitutes.add(self.salt)
+                    raise RuntimeError('rollback')
+            except RuntimeError:
+                pass
+        self.assertEqual(recipe_match_index.match([self.salt.pk]), [])
+        self.assertEqual(recipe_match_index.match([self.tomato.pk])[0].total, 1)
+        self.assertEqual(substitute_graph.neighbors(self.tomato.pk), frozenset())
+
+    def test_committed_write_is_indexed(self):
+        recipe_match_index.ensure_built()
+        autocomplete_index.ensure_built()
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.salt, quantity=1, unit='g')
+            self.salt.name = '海盐'
+            self.salt.save()
+        self.assertEqual([match.recipe_id for match in recipe_match_index.match([self.salt.pk])], [self.recipe.pk])
+        self.assertEqual(autocomplete_index.suggest('海', kinds=[INGREDIENT]), [
+            {'type': INGREDIENT, 'id': self.salt.pk, 'name': '海盐'},
+        ])
+
+    @override_settings(INDEX_VERSION_CHECK_INTERVAL=0)
+    def test_write_from_another_process_triggers_rebuild(self):
+        recipe_match_index.ensure_built()
+        substitute_graph.ensure_built()
+        # 模拟其他进程的写入：本进程的信号不知情 (bulk_create 不触发信号)，只有版本号变化
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=self.recipe, ingredient=self.salt, quantity=1, unit='g'),
+        ])
+        Ingredient.common_substitutes.through.objects.bulk_create([
+            Ingredient.common_substitutes.through(from_ingredient_id=self.tomato.pk, to_ingredient_id=self.salt.pk),
+            Ingredient.common_substitutes.through(from_ingredient_id=self.salt.pk, to_ingredient_id=self.tomato.pk),
+        ])
+        self.assertEqual(recipe_match_index.match([self.salt.pk]), [])
+        bump_version(MATCH_INDEX)
+        bump_version(SUBSTITUTE_GRAPH)
+        self.assertEqual([match.recipe_id for match in recipe_match_index.match([self.salt.pk])], [self.recipe.pk])
+        self.assertEqual(substitute_graph.neighbors(self.tomato.pk), frozenset({self.salt.pk}))
+
+
+class IngredientSummaryTests(TestCase):
+    """Recipe.ingredient_ids / ingredient_count 随任何 RecipeIngredient 写入在提交后同步。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('summary', 'summary@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.egg = Ingredient.objects.create(name='鸡蛋')
+        cls.recipe = Recipe.objects.create(title='番茄炒蛋', status='published', author=cls.user)
+
+    def assert_summary(self, ingredient_ids):
+        self.recipe.refresh_from_db()
+        self.assertEqual(list(self.recipe.ingredient_ids), ingredient_ids)
+        self.assertEqual(self.recipe.ingredient_count, len(ingredient_ids))
+
+    def test_direct_writes_are_synced_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            tomato_row = RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.tomato, quantity=2, unit='piece')
+            RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.egg, quantity=3, unit='piece')
+            # 提交前不写冗余字段
+            self.assert_summary([])
+        self.assert_summary(sorted([self.tomato.pk, self.egg.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            tomato_row.delete()
+        self.assert_summary([self.egg.pk])
+
+    def test_rolled_back_write_is_not_synced(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    RecipeIngredient.objects.create(recipe=self.recipe, ingredient=self.tomato, quantity=2, unit='piece')
+                    raise RuntimeError('rollback')
+            except RuntimeError:
+                pass
+        self.assert_summary([])
+
+
+class RecipePartialUpdateTests(TestCase):
+    """PATCH 提交 ingredients_data / steps_data 时，列表中的每一行仍须是完整数据。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('editor', 'editor@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.recipe = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+        RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato, quantity=2, unit='piece')
+
+    def setUp(self):
+        reset_in_process_indexes()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def test_incomplete_rows_are_rejected(self):
+        response = self.client.patch(self.url, {'ingredients_data': [{'ingredient_id': self.tomato.pk}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('quantity', response.json()['ingredients_data']['0'])
+
+        response = self.client.patch(self.url, {'steps_data': [{'step_number': 1}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('description', response.json()['steps_data']['0'])
+
+    def test_created_recipe_is_indexed_after_commit(self):
+        data = {
+            'title': '凉拌番茄', 'status': 'published',
+            'ingredients_data': [{'ingredient_id': self.tomato.pk, 'quantity': 1, 'unit': 'piece'}],
+            'steps_data': [{'step_number': 1, 'description': '撒糖'}],
+        }
+        recipe_match_index.ensure_built()
+        recipe_search_index.ensure_built()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/recipes/', data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        recipe_id = response.json()['id']
+        self.assertIn(recipe_id, [match.recipe_id for match in recipe_match_index.match([self.tomato.pk])])
+        self.assertIn(recipe_id, recipe_search_index.search(['撒糖']))
+        self.assertEqual(Recipe.objects.get(pk=recipe_id).ingredient_ids, [self.tomato.pk])
+
+    def _patch_diff(self, size):
+        """准备 1 + 2 * size 行食材与步骤的菜谱，PATCH 保留首行、修改 size 行、删除 size 行、新增 size 行。"""
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(title=f'番茄汤 {size}', status='published', author=self.user)
+            ingredients = Ingredient.objects.bulk_create([Ingredient(name=f'食材 {size}-{i}') for i in range(1 + 3 * size)])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=recipe, ingredient=ingredient, quantity=1, unit='g') for ingredient in ingredients[:1 + 2 * size]
+            ])
+            RecipeStep.objects.bulk_create([
+                RecipeStep(recipe=recipe, step_number=i + 1, description='原步骤') for i in range(1 + 2 * size)
+            ])
+        kept_ids = (recipe.recipeingredient_set.get(ingredient=ingredients[0]).pk, recipe.steps.get(step_number=1).pk)
+        kept = ingredients[:1]
+        updated = ingredients[1:1 + size]
+        added = ingredients[1 + 2 * size:]
+        data = {
+            'ingredients_data': (
+                [{'ingredient_id': ingredient.pk, 'quantity': 1, 'unit': 'g'} for ingredient in kept]
+                + [{'ingredient_id': ingredient.pk, 'quantity': 2, 'unit': 'g'} for ingredient in updated + added]
+            ),
+            'steps_data': (
+                [{'step_number': 1, 'description': '原步骤'}]
+                + [{'step_number': i + 2, 'description': '新步骤'} for i in range(size)]
+                + [{'step_number': 100 + i, 'description': '新增步骤'} for i in range(size)]
+            ),
+        }
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/recipes/{recipe.pk}/', data, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(recipe.recipeingredient_set.count(), 1 + 2 * size)
+        self.assertEqual(recipe.steps.count(), 1 + 2 * size)
+        self.assertEqual(recipe.recipeingredient_set.filter(quantity=2).count(), 2 * size)
+        self.assertEqual((recipe.recipeingredient_set.get(ingredient=ingredients[0]).pk, recipe.steps.get(step_number=1).pk), kept_ids)
+        return len(queries)
+
+    def test_update_query_count_does_not_grow_with_diff_size(self):
+        recipe_match_index.ensure_built()
+        recipe_search_index.ensure_built()
+        self._patch_diff(1)  # 预热用户与索引相关的缓存
+        self.assertEqual(self._patch_diff(2), self._patch_diff(20))
+
+    def test_partial_update_still_skips_missing_top_level_fields(self):
+        data = {'ingredients_data': [{'ingredient_id': self.tomato.pk, 'quantity': 3, 'unit': 'piece'}]}
+        response = self.client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, '番茄汤')
+        self.assertEqual(self.recipe.recipeingredient_set.get().quantity, 3)
+
+
+class KeysetPaginationTests(TestCase):
+    """游标分页：逐页翻完不重复不遗漏；客户端伪造的游标返回 404 而不是 500。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('pager', 'pager@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.recipes = [Recipe.objects.create(title=f'番茄菜 {i}', status='published', author=cls.user) for i in range(12)]
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(recipe=recipe, ingredient=cls.tomato, quantity=1, unit='piece') for recipe in cls.recipes
+        ])
+
+    def setUp(self):
+        reset_in_process_indexes()
+
+    def collect_pages(self, params):
+        client = APIClient()
+        response = client.get('/api/recipes/', {**params, 'pagination': 'cursor'})
+        ids = []
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            ids.extend(recipe['id'] for recipe in data['results'])
+            if data['next'] is None:
+                return ids
+            response = client.get(data['next'])
+
+    def test_pages_cover_all_recipes(self):
+        expected = sorted(recipe.pk for recipe in self.recipes)
+        self.assertEqual(sorted(self.collect_pages({})), expected)
+        self.assertEqual(sorted(self.collect_pages({'available_ingredients': str(self.tomato.pk)})), expected)
+
+    def test_malformed_cursors_are_not_found(self):
+        def cursor(position):
+            return urlsafe_b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+
+        updated_at = self.recipes[0].updated_at.isoformat()
+        cursors = [
+            'not base64!',
+            'WyJ4IiwieSJd',  # ["x", "y"]
+            cursor({'a': 1}),
+            cursor([updated_at]),
+            cursor([updated_at, 'x']),
+            cursor([updated_at, 10 ** 30]),
+            cursor([updated_at, [1]]),
+            cursor([updated_at[:19], 1]),  # 不带时区
+            cursor([None, 1]),
+        ]
+        for value in cursors:
+            response = APIClient().get('/api/recipes/', {'cursor': value})
+            self.assertEqual(response.status_code, 404, value)
+            response = APIClient().get('/api/recipes/', {'cursor': value, 'available_ingredients': str(self.tomato.pk)})
+            self.assertEqual(response.status_code, 404, value)
+        params = {'available_ingredients': str(self.tomato.pk)}
+        for value in [cursor(['x', updated_at, 1]), cursor([1.0, updated_at, 'x']), cursor([1.0, updated_at[:19], 1])]:
+            response = APIClient().get('/api/recipes/', {**params, 'cursor': value})
+            self.assertEqual(response.status_code, 404, value)
+
+
+class RecipeDetailETagTests(TestCase):
+    """菜谱详情的 ETag 只随本菜谱 (评价、收藏状态、食材与饮食标签名称) 变化，不带 Last-Modified。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_user('viewer', 'viewer@example.com', 'password123')
+            cls.tomato = Ingredient.objects.create(name='番茄')
+            cls.recipe = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+            cls.other = Recipe.objects.create(title='蛋花汤', status='published', author=cls.user)
+            RecipeIngredient.objects.create(recipe=cls.recipe, ingredient=cls.tomato, quantity=2, unit='piece')
+            cls.vegan = DietaryPreferenceTag.objects.create(name='纯素')
+            cls.recipe.dietary_tags.add(cls.vegan)
+
+    def setUp(self):
+        reset_in_process_indexes()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/recipes/{self.recipe.pk}/'
+
+    def get_etag(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        return response['ETag']
+
+    def test_favorited_state_is_queried_once(self):
+        self.user.favorite_recipes.add(self.recipe)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertEqual(len([q for q in queries.captured_queries if 'favorite_recipes' in q['sql']]), 1)
+
+        response = self.client.get(f'/api/recipes/{self.other.pk}/')
+        self.assertFalse(response.json()['is_favorited'])
+
+    def test_etag_tracks_this_recipe_only(self):
+        etag = self.get_etag()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # If-Modified-Since 不作为验证条件
+        self.assertEqual(self.client.get(self.url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title = '紫菜蛋花汤'
+            self.other.save()
+        self.assertEqual(self.get_etag(), etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review = Review.objects.create(recipe=self.recipe, user=self.user, rating=4)
+        etag_with_review = self.get_etag()
+        self.assertNotEqual(etag_with_review, etag)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            review.delete()
+        self.assertNotEqual(self.get_etag(), etag_with_review)
+
+        etag = self.get_etag()
+        self.user.favorite_recipes.add(self.recipe)
+        self.assertNotEqual(self.get_etag(), etag)
+
+        etag = self.get_etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tomato.name = '西红柿'
+            self.tomato.save()
+        self.assertNotEqual(self.get_etag(), etag)
+
+        etag = self.get_etag()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vegan.name = '全素'
+            self.vegan.save()
+        self.assertNotEqual(self.get_etag(), etag)
+
+    def test_review_list_relies_on_etag(self):
+        url = f'/api/recipes/{self.recipe.pk}/reviews/'
+        with self.captureOnCommitCallbacks(execute=True):
+            early = Review.objects.create(recipe=self.recipe, user=self.user, rating=4)
+            Review.objects.create(recipe=self.recipe, user=User.objects.create_user('critic', 'critic@example.com', 'password123'), rating=2)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT').status_code, 200)
+
+        # 删除较早的评价不改变最近的更新时间，评价数量的变化仍会改变 ETag
+        with self.captureOnCommitCallbacks(execute=True):
+            early.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class UserEligibilityTests(TestCase):
+    """偏好标签的菜谱集合只在 apply_preferences=true 时计算；偏好或标签变化后缓存失效。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('eater', 'eater@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.egg = Ingredient.objects.create(name='鸡蛋')
+        cls.vegan = DietaryPreferenceTag.objects.create(name='纯素')
+        cls.soup = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+        cls.omelette = Recipe.objects.create(title='番茄炒蛋', status='published', author=cls.user)
+        RecipeIngredient.objects.create(recipe=cls.soup, ingredient=cls.tomato, quantity=2, unit='piece')
+        RecipeIngredient.objects.create(recipe=cls.omelette, ingredient=cls.tomato, quantity=2, unit='piece')
+        RecipeIngredient.objects.create(recipe=cls.omelette, ingredient=cls.egg, quantity=2, unit='piece')
+        cls.soup.dietary_tags.add(cls.vegan)
+
+    def setUp(self):
+        reset_in_process_indexes()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def matched_ids(self, **params):
+        response = self.client.get('/api/recipes/', {'available_ingredients': str(self.tomato.pk), **params})
+        self.assertEqual(response.status_code, 200)
+        return sorted(recipe['id'] for recipe in response.json()['results'])
+
+    def test_preferences_and_dislikes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.dietary_preferences.add(self.vegan)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.matched_ids(), sorted([self.soup.pk, self.omelette.pk]))
+        tag_table = Recipe.dietary_tags.through._meta.db_table
+        self.assertFalse([q for q in queries.captured_queries if tag_table in q['sql'] and 'COUNT' in q['sql'].upper()])
+        self.assertEqual(self.matched_ids(apply_preferences='true'), [self.soup.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.omelette.dietary_tags.add(self.vegan)
+        self.assertEqual(self.matched_ids(apply_preferences='true'), sorted([self.soup.pk, self.omelette.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.disliked_ingredients.add(self.egg)
+        self.assertEqual(self.matched_ids(), [self.soup.pk])
+
+    def test_deleting_a_preferred_tag_invalidates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.dietary_preferences.add(self.vegan)
+        self.assertEqual(self.matched_ids(apply_preferences='true'), [self.soup.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.vegan.delete()
+        self.assertEqual(self.matched_ids(apply_preferences='true'), sorted([self.soup.pk, self.omelette.pk]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.disliked_ingredients.add(self.egg)
+        self.assertEqual(self.matched_ids(), [self.soup.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            # 从食材一侧 clear()
+            self.egg.users_disliking.clear()
+        self.assertEqual(self.matched_ids(), sorted([self.soup.pk, self.omelette.pk]))
+
+
+class RatingAggregateTests(TestCase):
+    """评价的增删改增量更新菜谱的评分汇总；汇总不一致时 reconcile_recipe_ratings 可以修正。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user('chef', 'chef@example.com', 'password123')
+        cls.users = [User.objects.create_user(f'critic{i}', f'critic{i}@example.com', 'password123') for i in range(2)]
+        cls.recipe = Recipe.objects.create(title='番茄汤', status='published', author=cls.author)
+        cls.other = Recipe.objects.create(title='蛋花汤', status='published', author=cls.author)
+
+    def assert_aggregates(self, recipe, count, total, histogram):
+        recipe.refresh_from_db()
+        self.assertEqual((recipe.rating_count, recipe.rating_sum), (count, total))
+        self.assertAlmostEqual(recipe.rating_average, total / count if count else 0.0)
+        self.assertEqual([getattr(recipe, f'rating_{rating}') for rating in range(1, 6)], histogram)
+
+    def test_create_update_delete(self):
+        first = Review.objects.create(recipe=self.recipe, user=self.users[0], rating=5)
+        Review.objects.create(recipe=self.recipe, user=self.users[1], rating=3)
+        self.assert_aggregates(self.recipe, 2, 8, [0, 0, 1, 0, 1])
+
+        review = Review.objects.get(pk=first.pk)
+        review.rating = 1
+        review.save()
+        self.assert_aggregates(self.recipe, 2, 4, [1, 0, 1, 0, 0])
+
+        review.recipe = self.other
+        review.save()
+        self.assert_aggregates(self.recipe, 1, 3, [0, 0, 1, 0, 0])
+        self.assert_aggregates(self.other, 1, 1, [1, 0, 0, 0, 0])
+
+        Review.objects.get(pk=first.pk).delete()
+        self.assert_aggregates(self.other, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_deferred_instances(self):
+        Review.objects.create(recipe=self.recipe, user=self.users[0], rating=4)
+        review = Review.objects.only('id', 'comment').get(user=self.users[0])
+        review.comment = '好喝'
+        review.save()
+        self.assert_aggregates(self.recipe, 1, 4, [0, 0, 0, 1, 0])
+
+        review = Review.objects.defer('rating').get(user=self.users[0])
+        review.rating = 2
+        review.save()
+        self.assert_aggregates(self.recipe, 1, 2, [0, 1, 0, 0, 0])
+
+        Review.objects.only('id').filter(user=self.users[0]).delete()
+        self.assert_aggregates(self.recipe, 0, 0, [0, 0, 0, 0, 0])
+
+    def test_reconcile_command(self):
+        Review.objects.bulk_create([
+            Review(recipe=self.recipe, user=self.users[0], rating=5),
+            Review(recipe=self.recipe, user=self.users[1], rating=2),
+        ])
+        self.assert_aggregates(self.recipe, 0, 0, [0, 0, 0, 0, 0])
+        call_command('reconcile_recipe_ratings', stdout=io.StringIO())
+        self.assert_aggregates(self.recipe, 2, 7, [0, 1, 0, 0, 1])
+        self.assert_aggregates(self.other, 0, 0, [0, 0, 0, 0, 0])
+
+
+class FavoritePopularityTests(TestCase):
+    """收藏关系的 add / remove / clear (从用户或菜谱一侧) 都会同步收藏数与热度。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'fan{i}', f'fan{i}@example.com', 'password123') for i in range(3)]
+        cls.soup = Recipe.objects.create(title='番茄汤', status='published', author=cls.users[0])
+        cls.salad = Recipe.objects.create(title='沙拉', status='published', author=cls.users[0])
+
+    def assert_counts(self, soup, salad):
+        self.soup.refresh_from_db()
+        self.salad.refresh_from_db()
+        self.assertEqual((self.soup.favorite_count, self.salad.favorite_count), (soup, salad))
+
+    def test_add_remove_clear(self):
+        first, second, third = self.users
+        first.favorite_recipes.add(self.soup, self.salad)
+        second.favorite_recipes.add(self.soup)
+        self.salad.favorited_by.add(second, third)
+        # 重复添加不计数
+        first.favorite_recipes.add(self.soup)
+        self.assert_counts(2, 3)
+        self.assertEqual(self.soup.trending_score, 2.0)
+
+        # remove() 传入不存在的关系时只扣除实际删除的
+        first.favorite_recipes.remove(self.soup, self.soup.pk + self.salad.pk + 100)
+        third.favorite_recipes.remove(self.soup)
+        self.assert_counts(1, 3)
+
+        self.salad.favorited_by.remove(first, first)
+        self.assert_counts(1, 2)
+
+        second.favorite_recipes.clear()
+        self.assert_counts(0, 1)
+
+        self.salad.favorited_by.clear()
+        self.assert_counts(0, 0)
+        # 热度不因取消收藏回退
+        self.assertEqual(self.salad.trending_score, 3.0)
+
+    def test_fold_decays_trending_score(self):
+        self.users[0].favorite_recipes.add(self.soup)
+        call_command('fold_trending_scores', decay=0.5, stdout=io.StringIO())
+        self.soup.refresh_from_db()
+        self.assertEqual(self.soup.trending_score, 0.5)
+
+
+class ShoppingListTests(TestCase):
+    """加入购物清单：按基准单位合并用量 (含份量倍数)，跳过库存中的食材，不可见的菜谱返回 400。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_user('shopper', 'shopper@example.com', 'password123')
+            other = User.objects.create_user('drafter', 'drafter@example.com', 'password123')
+            cls.flour = Ingredient.objects.create(name='面粉')
+            cls.egg = Ingredient.objects.create(name='鸡蛋')
+            cls.salt = Ingredient.objects.create(name='盐')
+            cls.milk = Ingredient.objects.create(name='牛奶')
+            cls.onion = Ingredient.objects.create(name='洋葱')
+            cls.bread = Recipe.objects.create(title='面包', status='published', author=other)
+            cls.pancake = Recipe.objects.create(title='煎饼', status='published', author=other)
+            cls.draft = Recipe.objects.create(title='草稿', status='draft', author=other)
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(recipe=cls.bread, ingredient=cls.flour, quantity=525, unit='g'),
+                RecipeIngredient(recipe=cls.bread, ingredient=cls.egg, quantity=2, unit='piece'),
+                RecipeIngredient(recipe=cls.bread, ingredient=cls.salt, quantity=5, unit='g'),
+                RecipeIngredient(recipe=cls.bread, ingredient=cls.onion, quantity=1, unit='piece'),
+                RecipeIngredient(recipe=cls.pancake, ingredient=cls.flour, quantity=0.05, unit='kg'),
+                RecipeIngredient(recipe=cls.pancake, ingredient=cls.milk, quantity=200, unit='ml'),
+                RecipeIngredient(recipe=cls.pancake, ingredient=cls.onion, quantity=1, unit='piece'),
+                RecipeIngredient(recipe=cls.draft, ingredient=cls.milk, quantity=1, unit='l'),
+            ])
+            UserInventoryItem.objects.create(user=cls.user, ingredient=cls.salt)
+            ShoppingListItem.objects.create(user=cls.user, ingredient=cls.flour, quantity=200, unit='kg')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/recipes/add-to-shopping-list/'
+
+    def test_batch_merges_units_and_multipliers(self):
+        data = {'recipes': [{'recipe_id': self.bread.pk, 'multiplier': 2}, {'recipe_id': self.pancake.pk}]}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual((response.json()['created'], response.json()['merged']), (3, 1))
+
+        items = {
+            item.ingredient_id: (item.quantity, item.unit, item.related_recipe_id)
+            for item in ShoppingListItem.objects.filter(user=self.user)
+        }
+        self.assertEqual(items, {
+            # 200 kg + 525 g * 2 + 0.05 kg，合并进已有的未购买条目
+            self.flour.pk: (201.1, 'kg', None),
+            self.egg.pk: (4, 'piece', self.bread.pk),
+            self.milk.pk: (200, 'ml', self.pancake.pk),
+            # 两个菜谱共同需要的食材不关联到单个菜谱
+            self.onion.pk: (3, 'piece', None),
+        })
+
+    def test_single_recipe_skips_inventory(self):
+        response = self.client.post(f'/api/recipes/{self.bread.pk}/add_to_shopping_list/', {}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertFalse(ShoppingListItem.objects.filter(user=self.user, ingredient=self.salt).exists())
+        self.assertEqual(ShoppingListItem.objects.get(user=self.user, ingredient=self.flour).quantity, 200.525)
+
+    def test_invisible_recipe_is_rejected(self):
+        data = {'recipes': [{'recipe_id': self.pancake.pk}, {'recipe_id': self.draft.pk}]}
+        response = self.client.post(self.url, data, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(str(self.draft.pk), response.json()['error'])
+        self.assertEqual(ShoppingListItem.objects.filter(user=self.user).count(), 1)
+
+
+class SearchTermTests(TestCase):
+    def test_short_terms_need_bigram_index(self):
+        for term in ['番茄', '汤', 'AB', 'a-b', '1份']:
+            self.assertTrue(needs_bigram_index(term), term)
+        for term in ['番茄汤', 'tomato', 'a-bcd', '---']:
+            self.assertFalse(needs_bigram_index(term), term)
+
+
+class VersionBumpTests(TestCase):
+    """同一事务内的写入对每个版本号只递增一次；评价不影响菜谱目录版本号，详情缓存只随本菜谱变化。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_user('bumper', 'bumper@example.com', 'password123')
+            cls.recipe = Recipe.objects.create(title='番茄汤', status='published', author=cls.user)
+            cls.other = Recipe.objects.create(title='蛋花汤', status='published', author=cls.user)
+            cls.ingredients = [Ingredient.objects.create(name=f'食材{i}') for i in range(10)]
+
+    def setUp(self):
+        reset_in_process_indexes()
+
+    def test_bumps_are_coalesced_per_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i, ingredient in enumerate(self.ingredients):
+                RecipeIngredient.objects.create(recipe=self.recipe, ingredient=ingredient, quantity=1, unit='g')
+                RecipeStep.objects.create(recipe=self.recipe, step_number=i + 1, description=f'步骤{i}')
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                RecipeIngredient.objects.filter(recipe=self.recipe).delete()
+                RecipeStep.objects.filter(recipe=self.recipe).delete()
+        bumps = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "recipes_dataversion"')]
+        self.assertEqual(len(bumps), len(set(bumps)))
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.ingredient_count, 0)
+
+    def test_review_does_not_bump_catalogue(self):
+        version = get_version(RECIPE_CATALOGUE)
+        with self.captureOnCommitCallbacks(execute=True):
+            Review.objects.create(recipe=self.recipe, user=self.user, rating=5)
+        self.assertEqual(get_version(RECIPE_CATALOGUE), version)
+
+    @override_settings(RECIPE_RESPONSE_CACHE_TIMEOUT=60)
+    def test_anonymous_detail_cache_tracks_recipe_state(self):
+        url = f'/api/recipes/{self.recipe.pk}/'
+        self.assertEqual(APIClient().get(url).json()['title'], '番茄汤')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.title = '紫菜蛋花汤'
+            self.other.save()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(APIClient().get(url).json()['title'], '番茄汤')
+        # 其他菜谱的修改不使本菜谱的缓存失效：不再预取食材、步骤
+        self.assertFalse([q for q in queries.captured_queries if 'recipes_recipestep' in q['sql']])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            RecipeStep.objects.create(recipe=self.recipe, step_number=1, description='切番茄')
+        self.assertEqual([step['description'] for step in APIClient().get(url).json()['steps']], ['切番茄'])
@@ -0,0 +1,103 @@
+# recipes/units.py
+"""
+RecipeIngredient.UNIT_CHOICES 的单位换算。
+
+菜谱用量以多种单位保存 (g / kg / ml / l / tsp / tbsp / cup / piece ...)，无法直接相加或比较。
+这里把用量换算到基准单位：质量统一为 g，体积统一为 ml，个数为 piece。
+若食材填写了密度 (Ingredient.density, g/ml) 或单个重量 (Ingredient.piece_weight, g)，
+体积与个数会进一步换算为 g，使同一食材不同写法的用量可以合并。
+slice / pinch / dash / to_taste 等无法度量的单位保持原样 (系数 1)，只与相同单位合并。
+
+批量换算 (convert_many) 先为每个 (食材, 单位) 组合预先算好 (系数, 基准单位)，
+逐行只做一次字典查找和一次乘法；`python manage.py benchmark_units` 可测量吞吐量。
+"""
+
+from django.db.models import Q
+
+from .models import Ingredient
+
+GRAM = 'g'
+MILLILITER = 'ml'
+PIECE = 'piece'
+
+# 单位 -> (换算到基准单位的系数, 基准单位)
+UNIT_CONVERSIONS = {
+    'g': (1.0, GRAM),
+    'kg': (1000.0, GRAM),
+    'ml': (1.0, MILLILITER),
+    'l': (1000.0, MILLILITER),
+    'tsp': (5.0, MILLILITER),
+    'tbsp': (15.0, MILLILITER),
+    'cup': (240.0, MILLILITER),
+    'piece': (1.0, PIECE),
+}
+
+# 展示时基准单位的用量达到阈值后改用更大的单位
+_DISPLAY_UNITS = {
+    GRAM: (1000.0, 'kg'),
+    MILLILITER: (1000.0, 'l'),
+}
+
+
+def unit_conversion(unit, density=None, piece_weight=None):
+    """返回 unit 换算到基准单位的 (系数, 基准单位)；给出密度 / 单个重量时体积与个数换算为 g。"""
+    factor, base = UNIT_CONVERSIONS.get(unit, (1.0, unit))
+    if base == MILLILITER and density:
+        return factor * density, GRAM
+    if base == PIECE and piece_weight:
+        return factor * piece_weight, GRAM
+    return factor, base
+
+
+def to_base(quantity, unit, density=None, piece_weight=None):
+    """单个用量换算到基准单位，返回 (用量, 基准单位)。"""
+    factor, base = unit_conversion(unit, density, piece_weight)
+    return quantity * factor, base
+
+
+def for_display(quantity, base_unit):
+    """基准单位的用量转为便于阅读的单位，例如 1500 g -> 1.5 kg。"""
+    threshold = _DISPLAY_UNITS.get(base_unit)
+    if threshold is not None and quantity >= threshold[0]:
+        return quantity / threshold[0], threshold[1]
+    return quantity, base_unit
+
+
+def load_unit_profiles(ingredient_ids):
+    """一次查询取回食材的 {id: (density, piece_weight)}；两者都未填写的食材不在其中。"""
+    return {
+        ingredient_id: (density, piece_weight)
+        for ingredient_id, density, piece_weight in Ingredient.objects.filter(
+            Q(density__isnull=False) | Q(piece_weight__isnull=False),
+            pk__in=ingredient_ids,
+        ).values_list('id', 'density', 'piece_weight')
+    }
+
+
+def _conversion_tables(profiles):
+    # 每个有密度 / 单个重量的食材一张 {单位: (系数, 基准单位)} 表，其余食材共用默认表
+    return {
+        ingredient_id: {unit: unit_conversion(unit, density, piece_weight) for unit in UNIT_CONVERSIONS}
+        for ingredient_id, (density, piece_weight) in profiles.items()
+    }
+
+
+def convert_many(quantities, units, ingredient_ids=None, profiles=None):
+    """
+    批量换算：quantities / units / ingredient_ids 为等长序列，profiles 为 load_unit_profiles 的结果。
+    返回 (基准用量列表, 基准单位列表)。
+    """
+    default = UNIT_CONVERSIONS
+    if not profiles or ingredient_ids is None:
+        conversions = [default.get(unit) or (1.0, unit) for unit in units]
+    else:
+        tables = _conversion_tables(profiles)
+        lookup = tables.get
+        conversions = [
+            lookup(ingredient_id, default).get(unit) or (1.0, unit)
+            for unit, ingredient_id in zip(units, ingredient_ids)
+        ]
+    return (
+        [quantity * factor for quantity, (factor, _) in zip(quantities, conversions)],
+        [base for _, base in conversions],
+    )
@@ -0,0 +1,79 @@
+# recipes/versions.py
+"""
+数据版本号：保存在数据库 (DataVersion 表) 中的单调递增计数器。
+
+预渲染的快照、响应缓存、进程内索引等都以版本号判断自己是否过期，
+数据变化时只需递增版本号，旧缓存自然失效，无需逐个删除。
+版本号必须对所有 worker 进程可见，因此不放在缓存里 (默认的 LocMemCache 是进程内的，
+且缓存后端的 incr 不一定是原子的)，而是用一条带 F() 表达式的 UPDATE 递增。
+计数器以毫秒时间戳为初值，数据库重建后也不会与共享缓存中残留的旧版本号重复。
+"""
+
+import threading
+import time
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import DataVersion
+
+INGREDIENT_CATALOGUE = 'ingredients'
+RECIPE_CATALOGUE = 'recipes'
+# 菜谱的饮食标签 (eligibility.get_recipes_with_tags 的缓存以此失效)
+RECIPE_TAGS = 'recipe_tags'
+# 饮食标签本身 (名称等) 的变化，菜谱详情的 ETag 以此感知标签改名
+DIETARY_TAGS = 'dietary_tags'
+# 进程内索引各自的版本号 (见 indexes.py)，只随影响该索引的数据变化
+MATCH_INDEX = 'match_index'
+SUBSTITUTE_GRAPH = 'substitute_graph'
+SEARCH_INDEX = 'search_index'
+AUTOCOMPLETE_INDEX = 'autocomplete_index'
+
+
+def get_versions(names):
+    """一次查询读取多个版本号，返回 {name: version}；不存在的计数器在此初始化。"""
+    versions = dict(DataVersion.objects.filter(name__in=names).values_list('name', 'version'))
+    missing = [name for name in names if name not in versions]
+    if missing:
+        initial = int(time.time() * 1000)
+        DataVersion.objects.bulk_create(
+            [DataVersion(name=name, version=initial) for name in missing], ignore_conflicts=True
+        )
+        versions.update(DataVersion.objects.filter(name__in=missing).values_list('name', 'version'))
+    return versions
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_version(name):
+    """递增版本号并返回递增后的值 (并发递增时可能读到其他进程递增后的更大值)。"""
+    if not DataVersion.objects.filter(name=name).update(version=F('version') + 1):
+        # 计数器不存在 (首次使用)，初始化后即为新版本
+        return get_version(name)
+    return DataVersion.objects.filter(name=name).values_list('version', flat=True).get()
+
+
+_pending = threading.local()
+
+
+def schedule_bump(*names):
+    """
+    在当前事务提交后递增这些版本号 (不在事务中时立即递增)。
+    同一事务内的多次调用合并，每个版本号只递增一次：批量保存、删除多行时不会为每一行各写一次计数器。
+    """
+    pending = getattr(_pending, 'names', None)
+    if pending is None:
+        pending = _pending.names = set()
+    pending.update(names)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    names = getattr(_pending, 'names', None)
+    if not names:
+        return
+    _pending.names = set()
+    for name in sorted(names):
+        bump_version(name)
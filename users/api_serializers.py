@@ -1,11 +1,16 @@
 # users/api_serializers.py
 
+from django.conf import settings
 from rest_framework import serializers
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import User, UserInventoryItem, ShoppingListItem
 from recipes.models import DietaryPreferenceTag, Ingredient, RecipeIngredient # 导入 RecipeIngredient
 
+# 展示名称查找表只构建一次，序列化每一行时直接查字典
+UNIT_DISPLAY = dict(RecipeIngredient.UNIT_CHOICES)
+CATEGORY_DISPLAY = dict(Ingredient.CATEGORY_CHOICES)
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(
         write_only=True,
@@ -99,6 +104,44 @@ class UserInventoryItemSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'added_at', 'user', 'ingredient_name')
 
 
+class InventoryBulkItemSerializer(serializers.Serializer):
+    ingredient = serializers.IntegerField()
+    notes = serializers.CharField(max_length=255, required=False, allow_blank=True, allow_null=True)
+
+
+class InventoryBulkWriteSerializer(serializers.Serializer):
+    """批量加入库存：{"items": [{"ingredient": 1, "notes": "..."}, ...]}"""
+    items = InventoryBulkItemSerializer(many=True, allow_empty=False, max_length=settings.INVENTORY_BULK_MAX_ITEMS)
+
+
+class InventoryBulkDeleteSerializer(serializers.Serializer):
+    """批量移出库存：{"ingredients": [1, 2, ...]}"""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.INVENTORY_BULK_MAX_ITEMS
+    )
+
+
+class ShoppingListBulkSerializer(serializers.Serializer):
+    """
+    批量修改购物清单：{"ids": [1, 2], "operation": "purchase" | "unpurchase" | "delete", "move_to_inventory": false}
+    move_to_inventory 仅用于 purchase，把买到的食材同时加入库存。
+    """
+    ids = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=settings.SHOPPING_LIST_BULK_MAX_ITEMS
+    )
+    operation = serializers.ChoiceField(choices=['purchase', 'unpurchase', 'delete'])
+    move_to_inventory = serializers.BooleanField(default=False)
+
+    def validate(self, attrs):
+        if attrs['move_to_inventory'] and attrs['operation'] != 'purchase':
+            raise serializers.ValidationError({"move_to_inventory": "只有标记为已购买时才能同时加入库存。"})
+        return attrs
+
+
 class ShoppingListItemSerializer(serializers.ModelSerializer):
     """购物清单项目序列化器"""
     ingredient_name = serializers.CharField(source='ingredient.name', read_only=True)
@@ -119,8 +162,7 @@ class ShoppingListItemSerializer(serializers.ModelSerializer):
     def get_unit_display(self, obj):
         if not obj.unit:
             return ""
-        unit_choices_dict = dict(RecipeIngredient.UNIT_CHOICES)
-        return unit_choices_dict.get(obj.unit, obj.unit)
+        return UNIT_DISPLAY.get(obj.unit, obj.unit)
 
     class Meta:
         model = ShoppingListItem
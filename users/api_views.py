@@ -1,16 +1,29 @@
 # users/api_views.py (最终版)
 
+from django.db import transaction
 from rest_framework import generics, status, permissions, viewsets
 from rest_framework.response import Response
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.decorators import action
 from .models import User, UserInventoryItem, ShoppingListItem
 from .api_serializers import (
+    CATEGORY_DISPLAY,
+    UNIT_DISPLAY,
     UserRegistrationSerializer, 
     UserDetailSerializer,
     UserInventoryItemSerializer,
-    ShoppingListItemSerializer
+    InventoryBulkWriteSerializer,
+    InventoryBulkDeleteSerializer,
+    ShoppingListItemSerializer,
+    ShoppingListBulkSerializer
 )
+from .inventory import invalidate_inventory_vector
+from recipes.models import Ingredient
+from recipes.units import for_display, to_base
+
+# 分组视图中各分类的排列顺序 (与 Ingredient.CATEGORY_CHOICES 一致)，未分类的食材排在最后
+AISLE_ORDER = {category: index for index, (category, _) in enumerate(Ingredient.CATEGORY_CHOICES)}
+UNCATEGORIZED_DISPLAY = "未分类"
 
 class UserRegistrationView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -50,13 +63,87 @@ class UserInventoryViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['post', 'put', 'delete'], permission_classes=[permissions.IsAuthenticated])
+    def bulk(self, request):
+        """
+        批量维护库存 (例如扫描一张购物小票)，每项单独报告结果，查询次数与条目数无关。
+        POST: 加入库存，已存在的食材保持不变 (exists)；
+        PUT: 加入或更新备注 (upsert)，未提供 notes 时保留原备注；
+        DELETE: 按食材 ID 移出库存。
+        bulk_create 不触发信号，这里统一失效一次库存向量 (批量删除的逐行信号在提交后合并为一次)。
+        """
+        if request.method == 'DELETE':
+            return self._bulk_delete(request)
+        serializer = InventoryBulkWriteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        upsert = request.method == 'PUT'
+
+        # 同一食材出现多次时以最后一项为准
+        requested = {item['ingredient']: item for item in serializer.validated_data['items']}
+        valid_ids = set(Ingredient.objects.filter(pk__in=requested).values_list('id', flat=True))
+        with transaction.atomic():
+            existing = {
+                item.ingredient_id: item
+                for item in UserInventoryItem.objects.filter(user=user, ingredient_id__in=valid_ids)
+            }
+            statuses = {}
+            to_write = []
+            for ingredient_id, data in requested.items():
+                if ingredient_id not in valid_ids:
+                    statuses[ingredient_id] = 'invalid'
+                    continue
+                current = existing.get(ingredient_id)
+                if current is not None and not upsert:
+                    statuses[ingredient_id] = 'exists'
+                    continue
+                notes = data['notes'] if 'notes' in data else (current.notes if current is not None else None)
+                statuses[ingredient_id] = 'updated' if current is not None else 'created'
+                to_write.append(UserInventoryItem(user=user, ingredient_id=ingredient_id, notes=notes))
+            if to_write:
+                if upsert:
+                    conflict_options = {'update_conflicts': True, 'unique_fields': ['user', 'ingredient'], 'update_fields': ['notes']}
+                else:
+                    # 并发请求刚加入的同一食材保持原样，与 exists 语义一致
+                    conflict_options = {'ignore_conflicts': True}
+                UserInventoryItem.objects.bulk_create(to_write, **conflict_options)
+                invalidate_inventory_vector(user.pk)
+
+        results = [
+            {'ingredient': item['ingredient'], 'status': statuses[item['ingredient']]}
+            for item in serializer.validated_data['items']
+        ]
+        return self._bulk_response(results)
+
+    def _bulk_delete(self, request):
+        serializer = InventoryBulkDeleteSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ingredient_ids = serializer.validated_data['ingredients']
+        items = UserInventoryItem.objects.filter(user=request.user, ingredient_id__in=ingredient_ids)
+        with transaction.atomic():
+            existing_ids = set(items.values_list('ingredient_id', flat=True))
+            if existing_ids:
+                items.delete()
+                invalidate_inventory_vector(request.user.pk)
+        results = [
+            {'ingredient': ingredient_id, 'status': 'deleted' if ingredient_id in existing_ids else 'not_found'}
+            for ingredient_id in ingredient_ids
+        ]
+        return self._bulk_response(results)
+
+    def _bulk_response(self, results):
+        summary = {}
+        for result in results:
+            summary[result['status']] = summary.get(result['status'], 0) + 1
+        return Response({'results': results, 'summary': summary}, status=status.HTTP_200_OK)
+
 class ShoppingListItemViewSet(viewsets.ModelViewSet):
     serializer_class = ShoppingListItemSerializer
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
-        queryset = ShoppingListItem.objects.filter(user=user)
+        queryset = ShoppingListItem.objects.filter(user=user).select_related('ingredient', 'related_recipe')
         is_purchased_str = self.request.query_params.get('is_purchased')
         if is_purchased_str is not None:
             is_purchased = is_purchased_str.lower() in ['true', '1', 't']
@@ -74,4 +161,96 @@ class ShoppingListItemViewSet(viewsets.ModelViewSet):
         if deleted_count > 0:
             return Response({'detail': f'成功清空 {deleted_count} 项已购买的商品。'}, status=status.HTTP_204_NO_CONTENT)
         else:
-            return Response({'detail': '没有已购买的商品可以清空。'}, status=status.HTTP_200_OK)
\ No newline at end of file
+            return Response({'detail': '没有已购买的商品可以清空。'}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], url_path='bulk', permission_classes=[permissions.IsAuthenticated])
+    def bulk_update(self, request):
+        """
+        一次请求批量勾选 / 取消勾选 / 删除购物清单条目，对应一条 UPDATE (或 DELETE) ... WHERE id IN。
+        move_to_inventory=true 时在同一事务中把这些条目的食材加入库存 (已在库存中的保持不变)。
+        不属于当前用户的 ID 会被忽略，返回实际处理的条目数。
+        """
+        serializer = ShoppingListBulkSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        operation = serializer.validated_data['operation']
+        items = ShoppingListItem.objects.filter(user=user, id__in=serializer.validated_data['ids'])
+
+        moved = 0
+        with transaction.atomic():
+            if operation == 'delete':
+                affected, _ = items.delete()
+            else:
+                affected = items.update(is_purchased=operation == 'purchase')
+            if serializer.validated_data['move_to_inventory'] and affected:
+                ingredient_ids = set(items.values_list('ingredient_id', flat=True))
+                owned = set(
+                    UserInventoryItem.objects.filter(user=user, ingredient_id__in=ingredient_ids)
+                    .values_list('ingredient_id', flat=True)
+                )
+                new_ids = ingredient_ids - owned
+                if new_ids:
+                    UserInventoryItem.objects.bulk_create(
+                        [UserInventoryItem(user=user, ingredient_id=ingredient_id) for ingredient_id in new_ids],
+                        ignore_conflicts=True,
+                    )
+                    # bulk_create 不触发 post_save，手动失效库存向量缓存
+                    invalidate_inventory_vector(user.pk)
+                moved = len(new_ids)
+        return Response({'operation': operation, 'affected': affected, 'moved_to_inventory': moved}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def aisles(self, request):
+        """
+        按食材分类分组的购物清单 (逛超市时按货架顺序查看)。
+        同一食材、同一购买状态的多条记录换算到相同单位后合并为一项。整个列表只需一次联表查询。
+        """
+        rows = self.get_queryset().order_by('id').values_list(
+            'id', 'ingredient_id', 'ingredient__name', 'ingredient__category',
+            'ingredient__density', 'ingredient__piece_weight',
+            'quantity', 'unit', 'is_purchased', 'related_recipe__title',
+        )
+        merged = {}
+        for (item_id, ingredient_id, name, category, density, piece_weight,
+             quantity, unit, is_purchased, recipe_title) in rows:
+            base_quantity, base_unit = to_base(quantity or 0, unit, density, piece_weight)
+            key = (ingredient_id, base_unit, is_purchased)
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {
+                    'category': category,
+                    'ingredient': ingredient_id,
+                    'ingredient_name': name,
+                    'quantity': 0.0,
+                    'has_quantity': False,
+                    'unit': base_unit,
+                    'is_purchased': is_purchased,
+                    'item_ids': [],
+                    'related_recipe_titles': [],
+                }
+            entry['quantity'] += base_quantity
+            entry['has_quantity'] = entry['has_quantity'] or quantity is not None
+            entry['item_ids'].append(item_id)
+            if recipe_title and recipe_title not in entry['related_recipe_titles']:
+                entry['related_recipe_titles'].append(recipe_title)
+
+        aisles = {}
+        for entry in merged.values():
+            category = entry.pop('category')
+            if entry.pop('has_quantity'):
+                quantity, unit = for_display(entry['quantity'], entry['unit'])
+                entry['quantity'], entry['unit'] = round(quantity, 3), unit
+            else:
+                entry['quantity'] = None
+            entry['unit_display'] = UNIT_DISPLAY.get(entry['unit'], entry['unit'] or "")
+            aisles.setdefault(category, []).append(entry)
+
+        data = []
+        for category in sorted(aisles, key=lambda category: AISLE_ORDER.get(category, len(AISLE_ORDER))):
+            items = sorted(aisles[category], key=lambda entry: (entry['is_purchased'], entry['ingredient_name']))
+            data.append({
+                'category': category,
+                'category_display': CATEGORY_DISPLAY.get(category, UNCATEGORIZED_DISPLAY),
+                'items': items,
+            })
+        return Response(data)
@@ -0,0 +1,57 @@
+# users/inventory.py
+"""
+用户库存的食材向量缓存。
+
+“用我的库存做菜”需要用户库存中的全部食材 ID，这份列表读多写少，
+因此缓存在 Django 缓存中 (CACHES，各 worker 共享)，由 signals.py 在库存增删时失效。
+失效放在事务提交之后：提交前删除的话，并发请求可能在提交前把旧数据重新写回缓存。
+有效期也只设几分钟，万一漏掉失效 (例如绕过信号的批量写入)，旧数据不会长期存在。
+"""
+
+import threading
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import UserInventoryItem
+
+INVENTORY_VECTOR_TIMEOUT = 60 * 5
+
+
+def _inventory_vector_key(user_id):
+    return f'users:inventory_vector:{user_id}'
+
+
+def get_inventory_vector(user):
+    """返回用户库存中的食材 ID (升序元组)。"""
+    key = _inventory_vector_key(user.pk)
+    vector = cache.get(key)
+    if vector is None:
+        vector = tuple(sorted(
+            UserInventoryItem.objects.filter(user=user).values_list('ingredient_id', flat=True)
+        ))
+        cache.set(key, vector, INVENTORY_VECTOR_TIMEOUT)
+    return vector
+
+
+_pending = threading.local()
+
+
+def invalidate_inventory_vector(user_id):
+    """
+    在当前事务提交后删除缓存 (不在事务中时立即删除)；事务回滚时缓存保持不变。
+    同一事务内的多次调用合并：批量删除逐行触发信号时，每个用户只删除一次缓存。
+    """
+    pending = getattr(_pending, 'user_ids', None)
+    if pending is None:
+        pending = _pending.user_ids = set()
+    pending.add(user_id)
+    transaction.on_commit(_flush_pending)
+
+
+def _flush_pending():
+    user_ids = getattr(_pending, 'user_ids', None)
+    if not user_ids:
+        return
+    _pending.user_ids = set()
+    cache.delete_many([_inventory_vector_key(user_id) for user_id in sorted(user_ids)])
@@ -0,0 +1,17 @@
+# users/signals.py
+"""
+模型信号：库存变化时使缓存的库存食材向量失效 (事务提交后执行，见 inventory.py)。
+注意：bulk_create / update() 不会触发信号，这类写入需要调用方自行失效缓存。
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .inventory import invalidate_inventory_vector
+from .models import UserInventoryItem
+
+
+@receiver(post_save, sender=UserInventoryItem)
+@receiver(post_delete, sender=UserInventoryItem)
+def invalidate_inventory_vector_on_change(sender, instance, **kwargs):
+    invalidate_inventory_vector(instance.user_id)
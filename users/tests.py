@@ -1,3 +1,157 @@
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from recipes.models import Ingredient
+from .inventory import get_inventory_vector
+from .models import ShoppingListItem, User, UserInventoryItem
+
+
+class InventoryVectorCacheTests(TestCase):
+    """库存向量缓存在事务提交后才失效。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cook', 'cook@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+
+    def test_invalidated_on_commit(self):
+        self.assertEqual(get_inventory_vector(self.user), ())
+        with self.captureOnCommitCallbacks(execute=True):
+            item = UserInventoryItem.objects.create(user=self.user, ingredient=self.tomato)
+            # 提交前其他请求看到的仍是已提交的数据
+            self.assertEqual(get_inventory_vector(self.user), ())
+        self.assertEqual(get_inventory_vector(self.user), (self.tomato.pk,))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertEqual(get_inventory_vector(self.user), ())
+
+    def test_bulk_endpoints_invalidate(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(get_inventory_vector(self.user), ())
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/users/inventory/bulk/', {'items': [{'ingredient': self.tomato.pk}]}, format='json')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(get_inventory_vector(self.user), (self.tomato.pk,))
+
+
+class InventoryBulkTests(TestCase):
+    """批量维护库存：每项单独报告结果，批量删除只失效一次库存向量。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('scanner', 'scanner@example.com', 'password123')
+        cls.tomato = Ingredient.objects.create(name='番茄')
+        cls.onion = Ingredient.objects.create(name='洋葱')
+        cls.garlic = Ingredient.objects.create(name='大蒜')
+        UserInventoryItem.objects.create(user=cls.user, ingredient=cls.tomato, notes='冰箱')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/users/inventory/bulk/'
+
+    def _statuses(self, response):
+        self.assertEqual(response.status_code, 200, response.content)
+        return {result['ingredient']: result['status'] for result in response.json()['results']}
+
+    def _notes(self, ingredient):
+        return UserInventoryItem.objects.get(user=self.user, ingredient=ingredient).notes
+
+    def test_post_keeps_existing_items(self):
+        items = [{'ingredient': self.tomato.pk, 'notes': '新备注'}, {'ingredient': self.onion.pk}, {'ingredient': 999999}]
+        response = self.client.post(self.url, {'items': items}, format='json')
+        self.assertEqual(self._statuses(response), {self.tomato.pk: 'exists', self.onion.pk: 'created', 999999: 'invalid'})
+        self.assertEqual(response.json()['summary'], {'exists': 1, 'created': 1, 'invalid': 1})
+        self.assertEqual(self._notes(self.tomato), '冰箱')
+
+    def test_put_upserts_notes(self):
+        items = [{'ingredient': self.tomato.pk, 'notes': '新备注'}, {'ingredient': self.garlic.pk}]
+        response = self.client.put(self.url, {'items': items}, format='json')
+        self.assertEqual(self._statuses(response), {self.tomato.pk: 'updated', self.garlic.pk: 'created'})
+        self.assertEqual(self._notes(self.tomato), '新备注')
+
+        # 未提供 notes 时保留原备注
+        response = self.client.put(self.url, {'items': [{'ingredient': self.tomato.pk}]}, format='json')
+        self.assertEqual(self._statuses(response), {self.tomato.pk: 'updated'})
+        self.assertEqual(self._notes(self.tomato), '新备注')
+
+    def test_delete_invalidates_once(self):
+        UserInventoryItem.objects.bulk_create([
+            UserInventoryItem(user=self.user, ingredient=self.onion),
+            UserInventoryItem(user=self.user, ingredient=self.garlic),
+        ])
+        ingredients = [self.tomato.pk, self.onion.pk, self.garlic.pk, 999999]
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(self.url, {'ingredients': ingredients}, format='json')
+        self.assertEqual(self._statuses(response), {
+            self.tomato.pk: 'deleted', self.onion.pk: 'deleted', self.garlic.pk: 'deleted', 999999: 'not_found',
+        })
+        self.assertFalse(UserInventoryItem.objects.filter(user=self.user).exists())
+        cache_deletes = [query for query in queries if query['sql'].startswith('DELETE FROM "chefmate_cache"')]
+        self.assertEqual(len(cache_deletes), 1)
+
+
+class ShoppingListBulkTests(TestCase):
+    """批量勾选 / 取消勾选 / 删除购物清单条目，其他用户的条目不受影响。"""
+
+    @classmethod
+    def setUpTestData(cls):
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.user = User.objects.create_user('buyer', 'buyer@example.com', 'password123')
+            other = User.objects.create_user('neighbour', 'neighbour@example.com', 'password123')
+            cls.tomato = Ingredient.objects.create(name='番茄')
+            cls.egg = Ingredient.objects.create(name='鸡蛋')
+            cls.milk = Ingredient.objects.create(name='牛奶')
+            cls.tomato_item = ShoppingListItem.objects.create(user=cls.user, ingredient=cls.tomato)
+            cls.egg_item = ShoppingListItem.objects.create(user=cls.user, ingredient=cls.egg)
+            cls.milk_item = ShoppingListItem.objects.create(user=cls.user, ingredient=cls.milk, is_purchased=True)
+            cls.other_item = ShoppingListItem.objects.create(user=other, ingredient=cls.tomato)
+            UserInventoryItem.objects.create(user=cls.user, ingredient=cls.egg)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = '/api/users/shopping-list/bulk/'
+
+    def _post(self, ids, operation, **extra):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(self.url, {'ids': ids, 'operation': operation, **extra}, format='json')
+
+    def _purchased(self):
+        return set(ShoppingListItem.objects.filter(is_purchased=True).values_list('id', flat=True))
+
+    def test_purchase_and_unpurchase(self):
+        response = self._post([self.tomato_item.pk, self.egg_item.pk, self.other_item.pk], 'purchase')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json(), {'operation': 'purchase', 'affected': 2, 'moved_to_inventory': 0})
+        self.assertEqual(self._purchased(), {self.tomato_item.pk, self.egg_item.pk, self.milk_item.pk})
+
+        response = self._post([self.milk_item.pk], 'unpurchase')
+        self.assertEqual(response.json()['affected'], 1)
+        self.assertEqual(self._purchased(), {self.tomato_item.pk, self.egg_item.pk})
+
+    def test_delete_ignores_other_users(self):
+        response = self._post([self.tomato_item.pk, self.other_item.pk], 'delete')
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['affected'], 1)
+        self.assertFalse(ShoppingListItem.objects.filter(pk=self.tomato_item.pk).exists())
+        self.assertTrue(ShoppingListItem.objects.filter(pk=self.other_item.pk).exists())
+
+    def test_purchase_moves_to_inventory(self):
+        self.assertEqual(get_inventory_vector(self.user), (self.egg.pk,))
+        response = self._post([self.tomato_item.pk, self.egg_item.pk], 'purchase', move_to_inventory=True)
+        self.assertEqual(response.status_code, 200, response.content)
+        # 鸡蛋已在库存中，只新增番茄
+        self.assertEqual(response.json()['moved_to_inventory'], 1)
+        self.assertEqual(get_inventory_vector(self.user), tuple(sorted([self.tomato.pk, self.egg.pk])))
+
+    def test_move_to_inventory_requires_purchase(self):
+        response = self._post([self.tomato_item.pk], 'delete', move_to_inventory=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('move_to_inventory', response.json())
+        self.assertTrue(ShoppingListItem.objects.filter(pk=self.tomato_item.pk).exists())